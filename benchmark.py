@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import rdflib
+
+import cube_engine
+import population_datacube
+import table_cache
+import validator
+import zdravotnici_datacube
+from cube_reader import read_observations
+from cube_writer import FORMATS, output_path, write_graph
+
+# Synthetic inputs shaped like data/population.csv and data/zdravotnici.csv, with the
+# real okres and kraj code lists of data/. Every stage of a build is timed on its own
+# and the results are written as JSON, one record per (cube, rows, stage).
+# The population cube has one observation per okres whatever the input size, so for it
+# only ingestion and mapping scale with --sizes, the cube stages always see 77 observations.
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Times the stages of the cube builds on synthetic inputs')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='numbers of rows of the generated CSV files (up to 10^7)')
+    parser.add_argument('--cubes', nargs='+', choices=['population', 'zdravotnici'],
+                        default=['population', 'zdravotnici'])
+    parser.add_argument('--formats', nargs='+', choices=list(FORMATS), default=list(FORMATS),
+                        help='output formats whose serialization is timed')
+    parser.add_argument('--engines', nargs='+', choices=['native', 'sparql'], default=['native'],
+                        help='validation engines whose checks are timed')
+    parser.add_argument('--sparql-max-observations', type=int, default=200,
+                        help='largest cube the sparql engine is timed on, its IC-12 is quadratic in the '
+                             'observations (minutes at a few hundred)')
+    parser.add_argument('--csv-chunksize', type=int, default=100000)
+    parser.add_argument('--workdir', help='directory of the generated files, a temporary one by default')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark.json')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # Every run parses the sources, that is part of what is measured
+    table_cache.configure(None)
+    with tempfile.TemporaryDirectory() as temporary:
+        workdir = args.workdir or temporary
+        os.makedirs(workdir, exist_ok=True)
+        results = []
+        for rows in args.sizes:
+            for cube in args.cubes:
+                rng = np.random.default_rng(args.seed)
+                run = BENCHMARKS[cube]
+                print(f"{cube}: {rows} rows")
+                run(Recorder(results, cube, rows), rng, rows, workdir, args)
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'rdflib': rdflib.__version__,
+        'sizes': args.sizes,
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1)
+    print(f"Results written to {args.output}")
+
+
+class Recorder:
+    """Times stages of one (cube, rows) benchmark into the shared list of results."""
+
+    def __init__(self, results, cube: str, rows: int):
+        self.results = results
+        self.cube = cube
+        self.rows = rows
+
+    def time(self, stage: str, function, *arguments, **keywords):
+        start = time.perf_counter()
+        value = function(*arguments, **keywords)
+        self.record(stage, time.perf_counter() - start)
+        return value
+
+    def record(self, stage: str, seconds: float, **extra):
+        self.results.append({'cube': self.cube, 'rows': self.rows, 'stage': stage, 'seconds': seconds, **extra})
+        print(f"  {stage:<36} {seconds:9.3f}s")
+
+
+def benchmark_population(recorder: Recorder, rng, rows: int, workdir: str, args):
+    path = os.path.join(workdir, f'population-{rows}.csv')
+    generate_population(path, rows, rng)
+    df = recorder.time('ingestion', population_datacube.read_filtered, path, ['vuzemi_kod','hodnota'],
+                       population_datacube.FILTERS, args.csv_chunksize)
+    df = recorder.time('mapping', population_datacube.map_codes, df)
+    benchmark_cube(recorder, population_datacube.SPEC, df, workdir, args)
+
+
+def benchmark_zdravotnici(recorder: Recorder, rng, rows: int, workdir: str, args):
+    path = os.path.join(workdir, f'zdravotnici-{rows}.csv')
+    generate_zdravotnici(path, rows, rng)
+    columns = zdravotnici_datacube.GROUP_COLUMNS
+    df = recorder.time('ingestion', pd.read_csv, path, usecols=columns, dtype={column: str for column in columns})
+    recorder.time('groupby', lambda: df.groupby(columns).size().reset_index(name='Count'))
+    # What the builder runs, the same two stages fused chunk by chunk
+    df = recorder.time('ingestion+groupby (chunked)', zdravotnici_datacube.count_groups, path, columns,
+                       args.csv_chunksize)
+    benchmark_cube(recorder, zdravotnici_datacube.SPEC, df, workdir, args)
+
+
+def benchmark_cube(recorder: Recorder, spec, df: pd.DataFrame, workdir: str, args):
+    start = time.perf_counter()
+    graph = cube_engine.as_data_cube(spec, df)
+    seconds = time.perf_counter() - start
+    recorder.record('as_data_cube', seconds, triples=len(graph), observations=len(df))
+
+    for format in args.formats:
+        path = output_path(os.path.join(workdir, f'{spec.name}-{recorder.rows}.ttl'), format)
+        stats = write_graph(graph, path, format)
+        recorder.record(f'serialization:{format}', stats.seconds, triples=stats.triples, bytes=stats.bytes)
+        recorder.time(f'read_observations:{format}', read_observations, path, spec)
+
+    for engine in args.engines:
+        if engine == 'sparql' and len(df) > args.sparql_max_observations:
+            print(f"  validation:sparql skipped, {len(df)} observations > --sparql-max-observations")
+            continue
+        for result in validator.check(graph, engine):
+            recorder.record(f'validation:{engine}:{result.name}', result.seconds, passed=result.passed)
+
+
+BENCHMARKS = {
+    'population': benchmark_population,
+    'zdravotnici': benchmark_zdravotnici,
+}
+
+
+def territories():
+    """The okresy with their numeric code (kodrso), LAU code and NUTS code of their kraj."""
+    okresy = cube_engine.reference_table('data/okresy.csv')
+    # Extra-Regio has no kraj
+    okresy = okresy[okresy['chodnota'] != 'CZZZZZ']
+    kraje = cube_engine.reference_table('data/kraje.csv').iloc[1:]
+    okresy_to_kraje = cube_engine.reference_table('data/okresy_to_kraje.csv')
+    kraj = cube_engine.resolve_codes(okresy['kodrso'], okresy_to_kraje, 'chodnota2', 'chodnota1')
+    return pd.DataFrame({
+        'kodrso': okresy['kodrso'].to_numpy(),
+        'okres': okresy['chodnota'].to_numpy(),
+        'kraj': cube_engine.resolve_codes(kraj, kraje, 'chodnota', 'cznuts').to_numpy(),
+    })
+
+
+def generate_population(path: str, rows: int, rng):
+    # One DEM0004 row per okres (more would be duplicate observations), the rest are other
+    # indicators and territory levels the builder filters out
+    okresy = territories()['kodrso'].to_numpy()[:rows]
+    fillers = rows - len(okresy)
+    vuk = np.concatenate([np.full(len(okresy), 'DEM0004'),
+                          rng.choice(['DEM0001', 'DEM0002', 'DEM0003', 'DEM0004'], fillers)])
+    vuzemi_cis = np.concatenate([np.full(len(okresy), 101), rng.choice([97, 100, 101], fillers)])
+    # A filler DEM0004 row is moved off the okres code list
+    vuzemi_cis[len(okresy):][(vuk[len(okresy):] == 'DEM0004') & (vuzemi_cis[len(okresy):] == 101)] = 100
+    df = pd.DataFrame({
+        'idhod': rng.integers(10**8, 10**9, rows),
+        'hodnota': rng.integers(10**4, 1_300_000, rows),
+        'stapro_kod': 4355,
+        'vuk': vuk,
+        'vuk_text': 'Střední stav obyvatel',
+        'casref_do': '2021-12-31',
+        'vuzemi_cis': vuzemi_cis,
+        'vuzemi_kod': np.concatenate([okresy, rng.choice(okresy, fillers)]),
+        'vuzemi_txt': 'Okres',
+    })
+    df.iloc[rng.permutation(rows)].to_csv(path, index=False)
+
+
+def generate_zdravotnici(path: str, rows: int, rng):
+    # The number of facility types grows with the input, so does the number of groups
+    places = territories()
+    types = max(10, rows // 100)
+    picked = rng.integers(0, len(places), rows)
+    pd.DataFrame({
+        'ZdravotnickeZarizeniId': np.arange(rows),
+        'NazevCely': 'Zdravotnicke zarizeni',
+        'DruhZarizeni': np.char.add('Druh zarizeni ', rng.integers(0, types, rows).astype(str)),
+        'KrajCode': places['kraj'].to_numpy()[picked],
+        'OkresCode': places['okres'].to_numpy()[picked],
+        'Obec': 'Obec',
+    }).to_csv(path, index=False)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    main()
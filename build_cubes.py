@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import cube_engine
+import instrumentation
+import table_cache
+import validator
+import per_capita_datacube
+import population_datacube
+import zdravotnici_datacube
+
+# Builder modules by cube name, each has a SPEC and a load_table(args)
+CUBES = {
+    population_datacube.SPEC.name: population_datacube,
+    zdravotnici_datacube.SPEC.name: zdravotnici_datacube,
+    per_capita_datacube.SPEC.name: per_capita_datacube,
+}
+
+# A job builds one cube, optionally restricted to the rows with the given column values
+# (e.g. a regional variant), in which case it gets its own output file
+Job = namedtuple('Job', ['cube', 'filters'])
+JobResult = namedtuple('JobResult', ['job', 'output', 'seconds', 'error'])
+
+
+def parse_job(text: str) -> Job:
+    """Parses cube[:column=value[,column=value...]], e.g. zdravotnici:KrajCode=CZ010."""
+    cube, _, filters = text.partition(':')
+    if cube not in CUBES:
+        raise ValueError(f"unknown cube '{cube}', choose from {', '.join(CUBES)}")
+    pairs = []
+    for item in filter(None, filters.split(',')):
+        column, separator, value = item.partition('=')
+        if not separator:
+            raise ValueError(f"filter '{item}' of job '{text}' is not column=value")
+        pairs.append((column, value))
+    return Job(cube, tuple(pairs))
+
+
+def job_label(job: Job):
+    return job.cube + ''.join(f':{column}={value}' for column, value in job.filters)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Builds a batch of cubes, sharing the imports, '
+                                                 'the code list tables and the term cache')
+    parser.add_argument('jobs', nargs='*', metavar='job',
+                        help='cube[:column=value,...] to build, every cube in full by default '
+                             f"(cubes: {', '.join(CUBES)})")
+    parser.add_argument('--jobs-file',
+                        help='file with one more job per line')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='number of jobs built at the same time, each in its own process')
+    cube_engine.add_arguments(parser)
+    args = parser.parse_args()
+    texts = list(args.jobs)
+    if args.jobs_file:
+        with open(args.jobs_file) as stream:
+            texts.extend(line.strip() for line in stream if line.strip() and not line.startswith('#'))
+    try:
+        args.jobs = [parse_job(text) for text in texts] or [Job(cube, ()) for cube in CUBES]
+    except ValueError as e:
+        parser.error(str(e))
+    if args.store_location is not None and args.processes > 1 and len(args.jobs) > 1:
+        # Every cube has its own graph in the store, but the processes would write it at the same time
+        parser.error('--store-location can only be written by one process, leave out --processes')
+    table_cache.configure(args.table_cache)
+    instrumentation.configure(args.profile)
+    return args
+
+
+def main():
+    args = parse_args()
+    if not args.validate_only:
+        cube_engine.load_reference_tables()
+    if args.validation_engine == 'sparql' and not args.skip_validation:
+        validator.prepare_queries()
+    if args.processes <= 1 or len(args.jobs) <= 1:
+        results = [run_job(job, args) for job in args.jobs]
+    else:
+        # Forked workers inherit the imports and the parsed reference tables
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+        with ProcessPoolExecutor(min(args.processes, len(args.jobs)), mp_context=context) as pool:
+            results = list(pool.map(run_job, args.jobs, [args] * len(args.jobs)))
+    for result in results:
+        instrumentation.log.debug(f"{job_label(result.job)} {'failed' if result.error else 'done'}", extra={'fields': {
+            'stage': 'job', 'job': job_label(result.job), 'output': result.output,
+            'seconds': round(result.seconds, 6), 'error': result.error}})
+    instrumentation.log.info(format_report(results))
+    if any(result.error for result in results):
+        sys.exit(1)
+
+
+def run_job(job: Job, args) -> JobResult:
+    # Workers that are not forked start with the default configuration
+    table_cache.configure(args.table_cache)
+    instrumentation.configure(args.profile)
+    builder = CUBES[job.cube]
+    spec = builder.SPEC
+    if job.filters:
+        base, extension = os.path.splitext(spec.output)
+        suffix = ''.join(f'-{column}-{value}' for column, value in job.filters)
+        spec = spec._replace(output=base + suffix + extension)
+    if args.validate_only:
+        instrumentation.log.info(f"Validating {job_label(job)} in {spec.output}")
+    else:
+        instrumentation.log.info(f"Building {job_label(job)} into {spec.output}")
+    start = time.perf_counter()
+    try:
+        if args.validate_only:
+            cube_engine.validate_output(spec, args)
+        else:
+            with instrumentation.stage('load', cube=spec.name, job=job_label(job)) as metrics:
+                df = builder.load_table(args)
+                for column, value in job.filters:
+                    df = df[df[column].astype(str) == value]
+                if job.filters and df.empty:
+                    raise ValueError(f"job {job_label(job)} selects no rows")
+                metrics['rows'] = len(df)
+            cube_engine.build(spec, df, args)
+        error = None
+    except Exception:
+        # A failed job is reported, the rest of the batch still runs
+        error = traceback.format_exc()
+        instrumentation.log.error(error)
+    return JobResult(job, spec.output, time.perf_counter() - start, error)
+
+
+def format_report(results):
+    lines = []
+    for result in results:
+        status = 'ok' if result.error is None else 'FAILED: ' + result.error.strip().splitlines()[-1]
+        lines.append(f"{job_label(result.job):<40} {result.seconds:8.3f}s {status}")
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    main()
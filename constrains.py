@@ -1,4 +1,6 @@
 
+# IC-20 and IC-21 are templates, $p is the qb:parentChildProperty of the code list
+# (see validator.sparql_queries)
 integrity_queries = [
 """
 ASK {
@@ -59,16 +61,14 @@ ASK {
 }
     
 """,
-# hazi to error: 'in <string>' requires string as left operand, not CompValue
-# coz vypada na nejakou chybu v rdflib??
-# kazdopadne sliceKey nikde nemam, tak by tento test mel byt splnen
-
-# """
-# ASK {
-#     ?sliceKey a qb:SliceKey .
-#     FILTER NOT EXISTS { [a qb:DataStructureDefinition] qb:sliceKey ?sliceKey }
-# }
-# """,
+# [a qb:DataStructureDefinition] uvnitr FILTER NOT EXISTS hazel ve starsich rdflib error
+# 'in <string>' requires string as left operand, not CompValue, proto je DSD v promenne
+"""
+ASK {
+    ?sliceKey a qb:SliceKey .
+    FILTER NOT EXISTS { ?dsd a qb:DataStructureDefinition ; qb:sliceKey ?sliceKey }
+}
+""",
 
 """
 ASK {
@@ -204,7 +204,8 @@ ASK {
           }
           
       } GROUP BY ?obs1 ?numMeasures
-        HAVING (?count != ?numMeasures)
+        # rdflib does not resolve the ?count alias inside HAVING
+        HAVING (COUNT(?obs2) != ?numMeasures)
   }
 }
     
@@ -243,7 +244,8 @@ ASK {
     ?obs qb:dataSet/qb:structure/qb:component/qb:componentProperty ?dim .
     ?dim a qb:DimensionProperty ;
         qb:codeList ?list .
-    ?list a qb:HierarchicalCodeList .
+    ?list a qb:HierarchicalCodeList ;
+          qb:parentChildProperty <$p> .
     ?obs ?dim ?v .
     FILTER NOT EXISTS { ?list qb:hierarchyRoot/<$p>* ?v }
 }
@@ -253,7 +255,10 @@ ASK {
     ?obs qb:dataSet/qb:structure/qb:component/qb:componentProperty ?dim .
     ?dim a qb:DimensionProperty ;
          qb:codeList ?list .
-    ?list a qb:HierarchicalCodeList .
+    ?list a qb:HierarchicalCodeList ;
+          qb:parentChildProperty ?pcp .
+    FILTER(isBlank(?pcp))
+    ?pcp owl:inverseOf <$p> .
     ?obs ?dim ?v .
     FILTER NOT EXISTS { ?list qb:hierarchyRoot/(^<$p>)* ?v }
 }
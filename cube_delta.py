@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import os
+from hashlib import sha1
+
+from rdflib import Graph
+
+from cube_terms import joined_values
+from cube_writer import ntriples_line
+from lazy_import import lazy_import
+
+pd = lazy_import('pandas')
+
+# The fingerprints of the observations of a cube are stored next to its output, an
+# incremental run compares them with the new table and only touches what differs.
+# Patching works line by line, so the output has to be N-Triples (see StreamingWriter).
+# Only the observations and the triples derived from the whole table (the concepts of the
+# code lists made up from it and the slices) are patched, the fingerprints are therefore only used while
+# the rest of the cube (its structure key, see cube_engine.structure_key) stays the same.
+# The derived triples of the previous run are stored too, those no longer derived are dropped.
+
+
+def fingerprint_path(path: str):
+    return path + '.fingerprints.csv'
+
+
+def structure_key_path(path: str):
+    return path + '.structure'
+
+
+def derived_path(path: str):
+    return path + '.derived.nt'
+
+
+def update_path(path: str):
+    return os.path.splitext(path)[0] + '.update.ru'
+
+
+def fingerprints(observations, df: pd.DataFrame, columns) -> pd.Series:
+    """Hash of the dimension and measure values of every observation, indexed by its IRI."""
+    digests = joined_values(df, columns).map(lambda values: sha1(values.encode('utf-8')).hexdigest())
+    return pd.Series(digests.to_numpy(), index=pd.Index([str(obs) for obs in observations], name='observation'),
+                     name='fingerprint')
+
+
+def load_fingerprints(path: str, key: str):
+    """The fingerprints of the cube at path, None unless it was written with the structure key."""
+    if not all(os.path.exists(stored) for stored in [path, fingerprint_path(path), derived_path(path)]):
+        return None
+    try:
+        with open(structure_key_path(path), encoding='utf-8') as stream:
+            if stream.read().strip() != key:
+                return None
+    except OSError:
+        return None
+    return pd.read_csv(fingerprint_path(path), index_col='observation', dtype=str)['fingerprint']
+
+
+def load_derived(path: str):
+    """The N-Triples lines of the derived triples of the previous run."""
+    with open(derived_path(path), encoding='utf-8') as stream:
+        return set(stream)
+
+
+def save_fingerprints(path: str, current: pd.Series, key: str, derived):
+    current.to_csv(fingerprint_path(path))
+    with open(structure_key_path(path), 'w', encoding='utf-8') as stream:
+        stream.write(key + '\n')
+    with open(derived_path(path), 'w', encoding='utf-8') as stream:
+        stream.writelines(sorted(derived))
+
+
+def ntriples_lines(graph: Graph):
+    return {ntriples_line(triple) for triple in graph}
+
+
+def discard_fingerprints(path: str):
+    # After a full Turtle build the output can no longer be patched line by line
+    for stored in [fingerprint_path(path), structure_key_path(path), derived_path(path)]:
+        if os.path.exists(stored):
+            os.remove(stored)
+
+
+def changes(previous: pd.Series, current: pd.Series):
+    """Returns the (added, removed, changed) observation IRIs, as strings."""
+    added = current.index.difference(previous.index)
+    removed = previous.index.difference(current.index)
+    common = current.index.intersection(previous.index)
+    changed = common[current[common].to_numpy() != previous[common].to_numpy()]
+    return added, removed, changed
+
+
+def patch(path: str, removed, delta: Graph, dropped=(), derived=()):
+    """
+    Drops every triple with a subject or object in removed (slice memberships) and every
+    line of dropped from the N-Triples file at path, then appends the triples of delta
+    and the lines of derived that are not in it yet. The same change is written as a SPARQL
+    Update next to the output, so a triple store holding the previous cube can apply it
+    directly. Returns the number of triples in the patched file.
+    """
+    removed = {f'<{obs}>' for obs in removed}
+    dropped = set(dropped)
+    added_lines = sorted(ntriples_lines(delta)) + sorted(set(derived) - dropped)
+
+    temporary = path + '.tmp'
+    with open(path, encoding='utf-8') as source, open(temporary, 'w', encoding='utf-8') as target:
+        pending = set(added_lines)
+        triples = 0
+        for line in source:
+            terms = line.split(' ', 3)
+            if line not in dropped and terms[0] not in removed and (len(terms) < 3 or terms[2] not in removed):
+                target.write(line)
+                pending.discard(line)
+                triples += bool(line.strip())
+        appended = [line for line in added_lines if line in pending]
+        target.writelines(appended)
+    os.replace(temporary, path)
+
+    with open(update_path(path), 'w', encoding='utf-8') as update:
+        for obs in sorted(removed):
+            update.write(f'DELETE WHERE {{ {obs} ?p ?o }} ;\n')
+            update.write(f'DELETE WHERE {{ ?s ?p {obs} }} ;\n')
+        if dropped:
+            update.write('DELETE DATA {\n')
+            update.writelines(sorted(dropped))
+            update.write('} ;\n')
+        update.write('INSERT DATA {\n')
+        update.writelines(appended)
+        update.write('}\n')
+    return triples + len(appended)
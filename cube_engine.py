@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import os
+from collections import namedtuple
+from functools import lru_cache
+from hashlib import sha1
+
+import rdflib
+from rdflib import Graph, BNode, Literal, Namespace
+# See https://rdflib.readthedocs.io/en/latest/_modules/rdflib/namespace.html
+from rdflib.namespace import QB, RDF, XSD, SKOS
+
+import cube_delta
+import instrumentation
+import table_cache
+import validator
+from instrumentation import log, stage
+from cube_terms import add_observations, code_terms, escape, keyed_observation_iris, term_cache, typed_literals
+from cube_writer import (FORMATS, StreamingWriter, load_output, load_streamed, open_store, output_path, store_graph,
+                         write_graph)
+from lazy_import import lazy_import
+
+pd = lazy_import('pandas')
+
+NS = Namespace("https://example.org/ontology#")
+NSR = Namespace("https://example.org/resources/")
+# We use custom Namespace here as the generated is limited in content
+# https://rdflib.readthedocs.io/en/stable/_modules/rdflib/namespace/_RDFS.html
+RDFS = Namespace("http://www.w3.org/2000/01/rdf-schema#")
+DCT = Namespace("http://purl.org/dc/terms/")
+OKRESY = Namespace("https://example.org/okresy/")
+KRAJE = Namespace("https://example.org/kraje/")
+OBORY = Namespace("https://example.org/obor-pece/")
+SDMX_SUBJECT = Namespace("http://purl.org/linked-data/sdmx/2009/subject#")
+SDMX_CONCEPT = Namespace("http://purl.org/linked-data/sdmx/2009/concept#")
+SDMX_MEASURE = Namespace("http://purl.org/linked-data/sdmx/2009/measure#")
+
+# Bound on the graph before the cube is written, so Turtle output gets readable prefixes
+PREFIXES = {
+    'qb': QB,
+    'skos': SKOS,
+    'rdfs': RDFS,
+    'dct': DCT,
+    'ont': NS,
+    'res': NSR,
+    'okres': OKRESY,
+    'kraj': KRAJE,
+    'obor': OBORY,
+    'sdmx-measure': SDMX_MEASURE,
+}
+
+# A cube is described by a CubeSpec, the functions below turn the spec and a table with
+# one row per observation into the triples of the cube.
+
+# labels maps a language to the label, codes is the namespace of the code list a
+# dimension's values are IRIs in (measures have none, their values are typed literals)
+# and code_list the CodeList generated for them
+Component = namedtuple('Component', ['property', 'column', 'labels', 'pref_label', 'range', 'codes', 'code_list'],
+                       defaults=[None, None])
+# A SKOS concept scheme of the concepts codes[code]. concepts(df) returns the code and
+# label of each concept of the table df of observations. A code list with a parent is
+# also a qb:HierarchicalCodeList, rooted in the concepts of the parent code list and
+# concepts() returns the parent code of each concept as well.
+CodeList = namedtuple('CodeList', ['iri', 'labels', 'codes', 'concepts', 'parent'], defaults=[None])
+Dataset = namedtuple('Dataset', ['iri', 'labels', 'description', 'comment', 'issued', 'publisher', 'subjects'])
+
+
+# slices names the dimensions (by column or property name) the observations are grouped
+# into a qb:Slice per value of, the observation IRIs are minted in namespace (cubes with
+# the same dimension values need different ones to keep them apart in a shared store)
+class CubeSpec(namedtuple('CubeSpec', ['name', 'output', 'structure', 'dimensions', 'measures', 'dataset', 'slices',
+                                       'namespace'], defaults=[(), NSR])):
+    __slots__ = ()
+
+    def dimension(self, name: str):
+        for dimension in self.dimensions:
+            if name in (dimension.column, local_name(dimension.property)):
+                return dimension
+        raise ValueError(f"Cube {self.name} has no dimension '{name}', choose from "
+                         + ', '.join(local_name(dimension.property) for dimension in self.dimensions))
+
+    @property
+    def dimension_columns(self):
+        return [dimension.column for dimension in self.dimensions]
+
+    @property
+    def measure_columns(self):
+        return [measure.column for measure in self.measures]
+
+
+def local_name(iri):
+    return str(iri).rsplit('#', 1)[-1].rsplit('/', 1)[-1]
+
+
+def slice_key(name: str):
+    return NSR['sliceKey-' + name]
+
+
+def slice_iri(name: str, code):
+    """IRI of the slice of the observations with the value code of the slice dimension name."""
+    return slice_namespace(name)[escape(str(code))]
+
+
+def slice_namespace(name: str):
+    return Namespace(str(NSR) + 'slice-' + name + '-')
+
+
+def main(spec: CubeSpec, load_table):
+    """Command line of a builder script, load_table(args) returns the table spec's cube is built from."""
+    args = parse_args()
+    if args.validate_only:
+        validate_output(spec, args)
+        return
+    with stage('load', cube=spec.name) as metrics:
+        df = load_table(args)
+        metrics['rows'] = len(df)
+    build(spec, df, args)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    args = parser.parse_args()
+    table_cache.configure(args.table_cache)
+    instrumentation.configure(args.profile)
+    return args
+
+
+def add_arguments(parser):
+    parser.add_argument('--stream', action='store_true',
+                        help='write observations to disk while they are generated instead of building the whole graph in memory')
+    parser.add_argument('--chunk-size', type=int, default=10000,
+                        help='number of triples buffered before a write in --stream mode')
+    parser.add_argument('--format', choices=list(FORMATS), default='turtle',
+                        help='output format of the in-memory build, --stream and --incremental always write N-Triples')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only rewrite the observations that changed since the previous --incremental run')
+    parser.add_argument('--store', default='Memory',
+                        help='rdflib store plugin the cube is built and validated in, e.g. BerkeleyDB')
+    parser.add_argument('--store-location',
+                        help='path or connection string a persistent --store is opened at, every cube is '
+                             'kept in a graph named after its output file')
+    parser.add_argument('--validation-engine', choices=['native', 'sparql'], default='native',
+                        help='native indexed checks, or the SPARQL queries of constrains.py as a reference')
+    parser.add_argument('--validation-processes', type=int, default=1,
+                        help='number of processes the integrity checks are spread over')
+    parser.add_argument('--slice-by', action='append', default=[], metavar='DIMENSION',
+                        help='group the observations into a qb:Slice per value of the dimension (e.g. kraj), '
+                             'can be repeated; an --incremental run with a different slicing rebuilds the whole cube')
+    parser.add_argument('--csv-chunksize', type=int, default=100000,
+                        help='number of rows of a source CSV read and processed at once')
+    validation = parser.add_mutually_exclusive_group()
+    validation.add_argument('--skip-validation', action='store_true',
+                            help='write the cube without running the integrity checks on it')
+    validation.add_argument('--validate-only', action='store_true',
+                            help='only run the integrity checks on the cube a previous build wrote '
+                                 '(same --format, --stream or --incremental), the sources are not read')
+    parser.add_argument('--profile', action='store_true',
+                        help='log every stage with its wall time, peak RSS and triples per second as JSON '
+                             '(also enabled by CUBE_PROFILE=1)')
+    parser.add_argument('--table-cache', default=table_cache.directory, metavar='DIRECTORY',
+                        help='directory the preprocessed source tables are cached in')
+    parser.add_argument('--no-table-cache', dest='table_cache', action='store_const', const=None,
+                        help='always parse the source CSV files')
+    return parser
+
+
+# Code list tables of data/ shared by the cubes
+REFERENCE_TABLES = ['data/okresy.csv', 'data/okresy_to_kraje.csv', 'data/kraje.csv']
+
+
+@lru_cache(maxsize=None)
+def reference_table(path: str):
+    """
+    A code list table, parsed once per process and shared by every cube built in it.
+    The returned frame is shared as well, callers must not modify it.
+    """
+    return table_cache.cached(os.path.basename(path), [path], '', lambda: pd.read_csv(path))
+
+
+def resolve_codes(codes: pd.Series, table: pd.DataFrame, key: str, value: str):
+    """
+    Maps codes through the key -> value columns of a code list table. Each distinct code
+    is looked up once in the table's index and the rows only take the position of their
+    code, so the work is linear and the result is a categorical column.
+    Raises ValueError listing the codes the table has no value for.
+    """
+    codes = codes.astype('category')
+    lookup = table.drop_duplicates(key).set_index(key)[value]
+    resolved = lookup.reindex(codes.cat.categories)
+    unmapped = resolved.index[resolved.isna()]
+    if len(unmapped):
+        counts = codes[codes.isin(unmapped)].value_counts()
+        listed = ', '.join(f"{code} ({count} rows)" for code, count in counts[counts > 0].items())
+        raise ValueError(f"No {value} in the code list for {len(unmapped)} {codes.name} codes: {listed}")
+    values = pd.Categorical(resolved.to_numpy()).take(codes.cat.codes.to_numpy(), allow_fill=True)
+    return pd.Series(values, index=codes.index, name=codes.name)
+
+
+def kraj_concepts(df: pd.DataFrame = None):
+    kraje = reference_table('data/kraje.csv')
+    return pd.DataFrame({'code': kraje['cznuts'], 'label': kraje['text']})
+
+
+def okres_concepts(df: pd.DataFrame = None):
+    okresy = reference_table('data/okresy.csv')
+    okresy_to_kraje = reference_table('data/okresy_to_kraje.csv')
+    kraje = reference_table('data/kraje.csv')
+    kraj = resolve_codes(okresy['kodrso'], okresy_to_kraje, 'chodnota2', 'chodnota1')
+    return pd.DataFrame({
+        'code': okresy['chodnota'],
+        'label': okresy['text'],
+        'parent': resolve_codes(kraj, kraje, 'chodnota', 'cznuts'),
+    })
+
+
+# Code lists of the territorial dimensions shared by the cubes, an okres rolls up to its kraj
+KRAJE_CODES = CodeList(NSR.kraje, {'cs': "Kraje", 'en': "Regions"}, KRAJE, kraj_concepts)
+OKRESY_CODES = CodeList(NSR.okresy, {'cs': "Okresy podle kraju", 'en': "Counties by region"}, OKRESY,
+                        okres_concepts, parent=KRAJE_CODES)
+
+
+def load_reference_tables():
+    # Loaded before the workers of a batch are forked, so they inherit the parsed tables
+    for path in REFERENCE_TABLES:
+        reference_table(path)
+
+
+def build(spec: CubeSpec, df: pd.DataFrame, args):
+    """Writes the cube of df to spec.output in the mode chosen by args and validates it."""
+    if args.slice_by:
+        # A dimension named by its column or repeated still gets one slice key, named after its property
+        names = [local_name(spec.dimension(name).property) for name in args.slice_by]
+        spec = spec._replace(slices=tuple(dict.fromkeys(names)))
+    data_cube = None
+    if args.incremental:
+        with stage('update', cube=spec.name, observations=len(df)) as metrics:
+            metrics['triples'] = update_cube(spec, df, args.chunk_size)
+    elif args.stream:
+        with stage('build', cube=spec.name, observations=len(df), mode='stream') as metrics:
+            with StreamingWriter(spec.output, args.chunk_size) as writer:
+                as_data_cube(spec, df, writer)
+            metrics['triples'] = writer.count
+        cube_delta.discard_fingerprints(spec.output)
+    else:
+        with stage('build', cube=spec.name, observations=len(df)) as metrics:
+            store = open_store(args.store, args.store_location, identifier=store_graph(spec.output))
+            data_cube = as_data_cube(spec, df, store)
+            metrics['triples'] = len(data_cube)
+        with stage('write', cube=spec.name, format=args.format) as metrics:
+            stats = write_graph(data_cube, output_path(spec.output, args.format), args.format)
+            metrics.update(triples=stats.triples, bytes=stats.bytes)
+        log.info(stats.summary())
+        cube_delta.discard_fingerprints(spec.output)
+    log.info(term_cache.summary(),
+             extra={'fields': {'interned': len(term_cache), 'hits': term_cache.hits, 'misses': term_cache.misses}})
+    # A streamed cube is only parsed back to fill a persistent store
+    if data_cube is None and args.store_location is not None:
+        with stage('reload', cube=spec.name) as metrics:
+            store = open_store(args.store, args.store_location, identifier=store_graph(spec.output))
+            data_cube = load_streamed(spec.output, store)
+            metrics['triples'] = len(data_cube)
+    if not args.skip_validation:
+        graph = data_cube
+        if graph is None:
+            with stage('sample', cube=spec.name) as metrics:
+                graph = validation_graph(spec, df)
+                metrics['triples'] = len(graph)
+        # Observation level constraints were checked on the table by as_data_cube,
+        # the reference engine still runs the whole suite
+        skip = validator.FRAME_CHECKS if args.validation_engine == 'native' else ()
+        with stage('validate', cube=spec.name, engine=args.validation_engine, processes=args.validation_processes):
+            run_constraint_checks(graph, args.validation_engine, skip, args.validation_processes)
+    if data_cube is not None:
+        data_cube.close()
+
+
+def validate_output(spec: CubeSpec, args):
+    """
+    Runs every integrity check on the cube a previous build with the same args wrote, in
+    the persistent store it was built in or, with the in-memory store, parsed from its output.
+    """
+    if args.store_location is not None:
+        data_cube = open_store(args.store, args.store_location, clear=False, identifier=store_graph(spec.output))
+        if not len(data_cube):
+            raise ValueError(f"The store at {args.store_location} has no {spec.output} cube, it has to be built first")
+    else:
+        path = spec.output if args.stream or args.incremental else output_path(spec.output, args.format)
+        with stage('reload', cube=spec.name, path=path) as metrics:
+            data_cube = load_output(path, open_store(args.store))
+            metrics['triples'] = len(data_cube)
+    with stage('validate', cube=spec.name, engine=args.validation_engine, processes=args.validation_processes):
+        run_constraint_checks(data_cube, args.validation_engine, (), args.validation_processes)
+    data_cube.close()
+
+
+def update_cube(spec: CubeSpec, df: pd.DataFrame, chunk_size: int):
+    """
+    Rewrites only the observations that were added, removed or have different values
+    since the previous incremental run. Without fingerprints of a previous run the
+    whole cube is streamed to spec.output. Returns the number of triples in it.
+    """
+    observations = keyed_observation_iris(spec.namespace, df, spec.dimension_columns)
+    current = cube_delta.fingerprints(observations, df, spec.dimension_columns + spec.measure_columns)
+    key = structure_key(spec)
+    # The code lists and slices are regenerated from the whole table, a concept or slice no
+    # longer in it is dropped
+    derived = Graph()
+    create_code_lists(derived, spec, df)
+    create_slices(derived, spec, spec.dataset.iri, df)
+    derived = cube_delta.ntriples_lines(derived)
+    previous = cube_delta.load_fingerprints(spec.output, key)
+    if previous is None:
+        log.info('No fingerprints of a previous build with the same structure and slices, building the whole cube')
+        with StreamingWriter(spec.output, chunk_size) as writer:
+            as_data_cube(spec, df, writer)
+        triples = writer.count
+    else:
+        validator.validate_frame(df, spec.dimension_columns, spec.measure_columns)
+        added, removed, changed = cube_delta.changes(previous, current)
+        log.info(f'{len(added)} added, {len(removed)} removed, {len(changed)} changed observations',
+                 extra={'fields': {'added': len(added), 'removed': len(removed), 'changed': len(changed)}})
+        delta = Graph()
+        rows = df[current.index.isin(added.union(changed))]
+        create_observations(delta, spec, spec.dataset.iri, rows)
+        dropped = cube_delta.load_derived(spec.output) - derived
+        triples = cube_delta.patch(spec.output, removed.union(changed), delta, dropped, derived)
+    cube_delta.save_fingerprints(spec.output, current, key, derived)
+    return triples
+
+
+def structure_key(spec: CubeSpec):
+    """
+    Digest of everything in spec the triples besides the observation values depend on
+    (components, code lists, dataset, slices), an incremental run only patches a cube
+    written with the same key.
+    """
+    def code_list_key(code_list):
+        if code_list is None:
+            return None
+        return code_list.iri, code_list.labels, code_list.codes, code_list_key(code_list.parent)
+
+    components = [(component.property, component.column, component.labels, component.pref_label, component.range,
+                   component.codes, code_list_key(component.code_list))
+                  for component in spec.dimensions + spec.measures]
+    text = repr((spec.name, spec.structure, components, spec.dataset, spec.slices, spec.namespace))
+    return sha1(text.encode('utf-8')).hexdigest()
+
+
+def as_data_cube(spec: CubeSpec, df: pd.DataFrame, collector=None):
+    validator.validate_frame(df, spec.dimension_columns, spec.measure_columns)
+    result = rdflib.Graph() if collector is None else collector
+    if isinstance(result, Graph):
+        for prefix, namespace in PREFIXES.items():
+            result.bind(prefix, namespace)
+    create_code_lists(result, spec, df)
+    dimensions = create_dimensions(result, spec)
+    measures = create_measures(result, spec)
+    structure = create_structure(result, spec, dimensions, measures)
+    dataset = create_dataset(result, spec, structure)
+    create_slices(result, spec, dataset, df)
+    create_observations(result, spec, dataset, df)
+    return result
+
+
+def validation_graph(spec: CubeSpec, df: pd.DataFrame):
+    """
+    The cube of df with only as many observations as it takes to use every value of every
+    dimension once, a streamed or patched cube is validated on it instead of being parsed
+    back. The code lists, structure, data set and slices are the ones written, so the code
+    list constraints (IC-19 to IC-21) see every value the observations take, the other
+    observation level constraints are checked on df by validate_frame.
+    """
+    sample = pd.Series(False, index=df.index)
+    for column in spec.dimension_columns:
+        sample |= ~df.duplicated(column)
+    graph = Graph()
+    create_code_lists(graph, spec, df)
+    structure = create_structure(graph, spec, create_dimensions(graph, spec), create_measures(graph, spec))
+    dataset = create_dataset(graph, spec, structure)
+    create_slices(graph, spec, dataset, df)
+    create_observations(graph, spec, dataset, df[sample])
+    return graph
+
+
+def create_code_lists(collector: Graph, spec: CubeSpec, df: pd.DataFrame):
+    code_lists = {}
+    for dimension in spec.dimensions:
+        code_list = dimension.code_list
+        # The parents of a hierarchy are generated even if no dimension uses their code list
+        while code_list is not None:
+            code_lists.setdefault(code_list.iri, code_list)
+            code_list = code_list.parent
+    for code_list in code_lists.values():
+        create_code_list(collector, code_list, df)
+
+
+def create_code_list(collector: Graph, code_list: CodeList, df: pd.DataFrame):
+    scheme = code_list.iri
+    collector.add((scheme, RDF.type, SKOS.ConceptScheme))
+    for language, label in code_list.labels.items():
+        collector.add((scheme, RDFS.label, Literal(label, lang=language)))
+    concepts = code_list.concepts(df)
+    terms = code_terms(concepts['code'], code_list.codes)
+    for concept, code, label in zip(terms, concepts['code'], concepts['label']):
+        collector.add((concept, RDF.type, SKOS.Concept))
+        collector.add((concept, SKOS.inScheme, scheme))
+        collector.add((concept, SKOS.notation, Literal(code)))
+        collector.add((concept, SKOS.prefLabel, Literal(label, lang='cs')))
+    if code_list.parent is None:
+        return
+    collector.add((scheme, RDF.type, QB.HierarchicalCodeList))
+    collector.add((scheme, QB.parentChildProperty, SKOS.narrower))
+    parents = code_terms(concepts['parent'], code_list.parent.codes)
+    for root in parents.unique():
+        collector.add((scheme, QB.hierarchyRoot, root))
+    for concept, parent in zip(terms, parents):
+        collector.add((concept, SKOS.broader, parent))
+        collector.add((parent, SKOS.narrower, concept))
+
+
+def create_dimensions(collector: Graph, spec: CubeSpec):
+    for dimension in spec.dimensions:
+        create_component(collector, dimension, QB.DimensionProperty)
+    return [dimension.property for dimension in spec.dimensions]
+
+
+def create_measures(collector: Graph, spec: CubeSpec):
+    for measure in spec.measures:
+        create_component(collector, measure, QB.MeasureProperty)
+        collector.add((measure.property, RDFS.subPropertyOf, SDMX_MEASURE.obsValue))
+    return [measure.property for measure in spec.measures]
+
+
+def create_component(collector: Graph, component: Component, type_):
+    collector.add((component.property, RDF.type, RDFS.Property))
+    collector.add((component.property, RDF.type, type_))
+    for language, label in component.labels.items():
+        collector.add((component.property, RDFS.label, Literal(label, lang=language)))
+    collector.add((component.property, SKOS.prefLabel, Literal(component.pref_label)))
+    collector.add((component.property, RDFS.range, component.range))
+    if component.code_list is not None:
+        collector.add((component.property, QB.codeList, component.code_list.iri))
+
+
+def create_structure(collector: Graph, spec: CubeSpec, dimensions, measures):
+
+    structure = spec.structure
+    collector.add((structure, RDF.type, QB.DataStructureDefinition))
+
+    for dimension in dimensions:
+        component = BNode()
+        collector.add((structure, QB.component, component))
+        collector.add((component, QB.dimension, dimension))
+        # The normalized form the constraints look the dimensions up through (qb:dimension
+        # is a sub-property of qb:componentProperty, rdflib does no inference)
+        collector.add((component, QB.componentProperty, dimension))
+
+    for measure in measures:
+        component = BNode()
+        collector.add((structure, QB.component, component))
+        collector.add((component, QB.measure, measure))
+        collector.add((component, QB.componentProperty, measure))
+        collector.add((component, QB.measureDimension, measure))
+
+    for name in spec.slices:
+        key = slice_key(name)
+        collector.add((structure, QB.sliceKey, key))
+        collector.add((key, RDF.type, QB.SliceKey))
+        collector.add((key, RDFS.label, Literal(f"Slice by {name}", lang='en')))
+        collector.add((key, QB.componentProperty, spec.dimension(name).property))
+    return structure
+
+
+def create_dataset(collector: Graph, spec: CubeSpec, structure):
+
+    metadata = spec.dataset
+    dataset = metadata.iri
+
+    collector.add((dataset, RDF.type, QB.DataSet))
+    for language, label in metadata.labels.items():
+        collector.add((dataset, RDFS.label, Literal(label, lang=language)))
+    collector.add((dataset, QB.structure, structure))
+
+    collector.add((dataset, DCT.description, Literal(metadata.description)))
+    collector.add((dataset, DCT.comment, Literal(metadata.comment)))
+    collector.add((dataset, DCT.issued, Literal(metadata.issued, datatype=XSD.date)))
+    collector.add((dataset, DCT.publisher, Literal(metadata.publisher)))
+
+    for subject in metadata.subjects:
+        collector.add((dataset, DCT.subject, subject))
+
+    return dataset
+
+
+def create_observations(collector: Graph, spec: CubeSpec, dataset, df: pd.DataFrame):
+    observations = keyed_observation_iris(spec.namespace, df, spec.dimension_columns)
+    add_observations(collector, observations, [
+        (RDF.type, QB.Observation),
+        (QB.dataSet, dataset),
+        *[(dimension.property, code_terms(df[dimension.column], dimension.codes))
+          for dimension in spec.dimensions],
+        *[(measure.property, typed_literals(df[measure.column], measure.range))
+          for measure in spec.measures],
+    ])
+    # The slice of every row is its code in the slice namespace, so the members of all
+    # slices are added column-wise in one pass and a slice is fetched by its IRI
+    for name in spec.slices:
+        add_observations(collector, code_terms(df[spec.dimension(name).column], slice_namespace(name)),
+                         [(QB.observation, observations)])
+
+
+def create_slices(collector: Graph, spec: CubeSpec, dataset, df: pd.DataFrame):
+    for name in spec.slices:
+        dimension = spec.dimension(name)
+        codes = df[dimension.column].drop_duplicates()
+        for slice_, value in zip(code_terms(codes, slice_namespace(name)), code_terms(codes, dimension.codes)):
+            collector.add((slice_, RDF.type, QB.Slice))
+            collector.add((slice_, QB.sliceStructure, slice_key(name)))
+            collector.add((slice_, dimension.property, value))
+            collector.add((dataset, QB.slice, slice_))
+
+
+def run_constraint_checks(graph: Graph, engine: str = 'native', skip=(), processes: int = 1):
+    results = validator.check(graph, engine, skip, processes)
+    for result in results:
+        log.debug(f"{result.name} {'passed' if result.passed else 'failed'}", extra={'fields': {
+            'stage': 'check', 'check': result.name, 'engine': engine, 'seconds': round(result.seconds, 6),
+            'passed': result.passed}})
+    if not instrumentation.enabled:
+        log.info(validator.format_report(results))
+    failed = [result.name for result in results if not result.passed]
+    if failed:
+        raise AssertionError('The datacube is not well formed, failed checks: ' + ', '.join(failed))
+    log.info('All tests have passed => the datacube is well formed')
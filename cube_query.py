@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+import argparse
+import shlex
+import sys
+from functools import lru_cache
+
+import pandas as pd
+
+import instrumentation
+import population_datacube
+import zdravotnici_datacube
+from cube_reader import graph_observations, read_observations
+from cube_writer import open_store, store_graph
+from instrumentation import stage
+
+# Answers the roll-up questions asked of the published cubes. Both cubes are loaded once,
+# the okres and kraj aggregates are computed up front and answered queries are kept in an
+# LRU cache, so a query is a lookup into a small precomputed table, not a SPARQL GROUP BY.
+
+# Aggregation levels, every okres rolls up to its kraj
+LEVELS = ['okres', 'kraj']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Answers roll-up queries over the population and care '
+                                                 'provider cubes, every query given on the command line '
+                                                 'or, without one, one query per line of stdin')
+    parser.add_argument('query', nargs=argparse.REMAINDER,
+                        help='e.g. "providers kraj", "per-capita okres --field Lekarna", "fields --kraj CZ010"')
+    parser.add_argument('--population', default=population_datacube.SPEC.output,
+                        help='population cube (.ttl, .nt or .nt.gz)')
+    parser.add_argument('--zdravotnici', default=zdravotnici_datacube.SPEC.output,
+                        help='care provider cube (.ttl, .nt or .nt.gz)')
+    parser.add_argument('--store',
+                        help='rdflib store plugin the cubes were built in (e.g. BerkeleyDB), read instead of the files')
+    parser.add_argument('--store-location',
+                        help='path or connection string of the --store, each cube is read from the graph named '
+                             'after its file')
+    parser.add_argument('--cache-size', type=int, default=256,
+                        help='number of answered queries kept')
+    parser.add_argument('--profile', action='store_true',
+                        help='log the load and every query with its timing as JSON (also CUBE_PROFILE=1)')
+    args = parser.parse_args()
+    if (args.store is None) != (args.store_location is None):
+        parser.error('--store and --store-location go together')
+    instrumentation.configure(args.profile)
+    return args
+
+
+def query_parser():
+    parser = argparse.ArgumentParser(prog='query', add_help=False)
+    queries = parser.add_subparsers(dest='name', required=True)
+    providers = queries.add_parser('providers', help='number of care providers per okres or kraj')
+    providers.add_argument('level', choices=LEVELS)
+    providers.add_argument('--field', help='only the providers of this DruhZarizeni')
+    per_capita = queries.add_parser('per-capita', help='care providers per 1,000 inhabitants per okres or kraj')
+    per_capita.add_argument('level', choices=LEVELS)
+    per_capita.add_argument('--field', help='only the providers of this DruhZarizeni')
+    fields = queries.add_parser('fields', help='number of care providers by DruhZarizeni')
+    area = fields.add_mutually_exclusive_group()
+    area.add_argument('--okres', help='only in this okres')
+    area.add_argument('--kraj', help='only in this kraj')
+    return parser
+
+
+def main():
+    args = parse_args()
+    with stage('load', population=args.population, zdravotnici=args.zdravotnici):
+        queries = CubeQueries(load_cube(args.zdravotnici, zdravotnici_datacube.SPEC, args),
+                              load_cube(args.population, population_datacube.SPEC, args),
+                              args.cache_size)
+    parser = query_parser()
+    lines = [shlex.join(args.query)] if args.query else (line for line in sys.stdin if line.strip())
+    for line in lines:
+        try:
+            query = parser.parse_args(shlex.split(line))
+        except SystemExit:
+            # argparse has printed what is wrong with it, the other queries are still answered
+            continue
+        try:
+            with stage('query', query=line.strip()):
+                result = queries.answer(query)
+        except ValueError as e:
+            instrumentation.log.error(str(e))
+            continue
+        print(result.to_string())
+
+
+def load_cube(path: str, spec, args) -> pd.DataFrame:
+    """The observations of the cube written to path, from its graph in the store the builder left it in if given."""
+    if args.store_location is None:
+        return read_observations(path, spec)
+    graph = open_store(args.store, args.store_location, clear=False, identifier=store_graph(path))
+    try:
+        if not len(graph):
+            raise ValueError(f"The store at {args.store_location} has no {path} cube, it has to be built first")
+        return graph_observations(graph, spec)
+    finally:
+        graph.close()
+
+
+class CubeQueries:
+    """
+    Roll-ups of the care provider cube (OkresCode, KrajCode, DruhZarizeni, Count) and the
+    population cube (okresCode, krajCode, population). The returned frames are shared by
+    every caller of the same query, callers must not modify them.
+    """
+
+    def __init__(self, providers: pd.DataFrame, population: pd.DataFrame, cache_size: int = 256):
+        providers = pd.DataFrame({
+            'okres': providers['OkresCode'].astype(str),
+            'kraj': providers['KrajCode'].astype(str),
+            'field': providers['DruhZarizeni'].astype(str),
+            'providers': providers['Count'].astype('int64'),
+        })
+        population = pd.DataFrame({
+            'okres': population['okresCode'].astype(str),
+            'kraj': population['krajCode'].astype(str),
+            'population': population['population'].astype('int64'),
+        })
+        # The okres rows rolled up to their kraj, per field and in total
+        self._by_field = {level: providers.groupby([level, 'field'])['providers'].sum() for level in LEVELS}
+        self._providers = {level: counts.groupby(level=level).sum() for level, counts in self._by_field.items()}
+        self._population = {level: population.groupby(level)['population'].sum() for level in LEVELS}
+        self._fields = providers.groupby('field')['providers'].sum()
+        self._per_capita = {level: self._ratio(level, self._providers[level]) for level in LEVELS}
+        for name in ['providers', 'per_capita', 'fields']:
+            setattr(self, name, lru_cache(maxsize=cache_size)(getattr(self, name)))
+
+    def answer(self, query):
+        """Answers a query parsed by query_parser()."""
+        if query.name == 'providers':
+            return self.providers(query.level, query.field)
+        if query.name == 'per-capita':
+            return self.per_capita(query.level, query.field)
+        return self.fields('okres' if query.okres else 'kraj' if query.kraj else None, query.okres or query.kraj)
+
+    def providers(self, level: str, field: str = None) -> pd.Series:
+        """Number of care providers per okres or kraj, of one DruhZarizeni if field is given."""
+        self._check_level(level)
+        if field is None:
+            return self._providers[level]
+        return self._field_counts(level, field)
+
+    def per_capita(self, level: str, field: str = None) -> pd.DataFrame:
+        """Providers, population and providers per 1,000 inhabitants per okres or kraj."""
+        self._check_level(level)
+        if field is None:
+            return self._per_capita[level]
+        return self._ratio(level, self._field_counts(level, field))
+
+    def fields(self, level: str = None, code: str = None) -> pd.Series:
+        """Number of care providers by DruhZarizeni, in the whole country or in one okres or kraj."""
+        if level is None:
+            return self._fields
+        self._check_level(level)
+        counts = self._by_field[level]
+        if code not in counts.index.get_level_values(level):
+            raise ValueError(f"No care providers in {level} '{code}'")
+        return counts.xs(code, level=level)
+
+    def cache_info(self):
+        return {name: getattr(self, name).cache_info() for name in ['providers', 'per_capita', 'fields']}
+
+    def _field_counts(self, level: str, field: str):
+        counts = self._by_field[level]
+        if field not in counts.index.get_level_values('field'):
+            raise ValueError(f"No care providers of field '{field}'")
+        # Areas without a provider of the field count zero
+        return counts.xs(field, level='field').reindex(self._providers[level].index, fill_value=0)
+
+    def _ratio(self, level: str, providers: pd.Series):
+        # Areas missing in one of the cubes are kept, without population the ratio is NaN
+        table = pd.concat([providers, self._population[level]], axis=1, join='outer')
+        table['providers'] = table['providers'].fillna(0).astype('int64')
+        table['per_1000'] = table['providers'] * 1000 / table['population']
+        return table.rename_axis(level)
+
+    @staticmethod
+    def _check_level(level: str):
+        if level not in LEVELS:
+            raise ValueError(f"Unknown level '{level}', choose from {', '.join(LEVELS)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+import gzip
+import re
+from urllib.parse import unquote
+
+import pandas as pd
+from rdflib import Graph, Literal, URIRef
+from rdflib.namespace import SKOS, XSD
+
+from cube_engine import CubeSpec
+
+# Reads the observations of a cube written by cube_engine back into a table without
+# building rdflib terms. The file is read line by line and only the objects of the spec's
+# component properties are kept, as the text of their tokens, along with the skos:notation
+# of every concept. Each distinct token is then decoded once: dimension values become the
+# notations of their concepts as categories, measure values numbers.
+
+# N-Triples term: IRI, blank node or literal with an optional datatype or language tag
+NT_LINE = re.compile(r'(\S+)\s+(<[^>]*>)\s+(.*?)\s*\.\s*$')
+
+# Turtle tokens of the subset the cubes are written in: IRIs, prefixed names, blank node
+# labels, literals (long ones included), numbers and the punctuation of a statement
+TOKEN = re.compile(r'''
+    <[^>]*>
+  | """(?:[^"\\]|\\.|"(?!""))*"""(?:\^\^(?:<[^>]*>|[^\s;,\[\]]*?(?=\s*[;,.\]]?\s*(?:\s|$)))|@[A-Za-z0-9-]+)?
+  | "(?:[^"\\]|\\.)*"(?:\^\^(?:<[^>]*>|[^\s;,\[\]]*?(?=\s*[;,.\]]?\s*(?:\s|$)))|@[A-Za-z0-9-]+)?
+  | [\[\]();,]
+  | \.(?=\s|$)
+  | [^\s\[\]();,"<]+?(?=[\s\[\]();,]|\.(?:\s|$)|$)
+''', re.VERBOSE)
+NOTATION = str(SKOS.notation)
+# Escapes of an N-Triples or Turtle string literal
+ESCAPE = re.compile(r'\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))')
+ESCAPES = {'t': '\t', 'b': '\b', 'n': '\n', 'r': '\r', 'f': '\f'}
+PREFIX = re.compile(r'\s*(?:@prefix|PREFIX)\s+([^\s:]*):\s*<([^>]*)>\s*\.?\s*$', re.IGNORECASE)
+
+
+def read_observations(path: str, spec: CubeSpec) -> pd.DataFrame:
+    """
+    The observations of the cube at path (.ttl, .nt or .nt.gz), one row each, with the
+    codes of the dimensions as categorical columns and the measures as integer (float if
+    not xsd:integer) columns, both named after the columns of spec.
+    """
+    properties = _properties(spec)
+    with _open(path) as stream:
+        if path.endswith(('.nt', '.nt.gz')):
+            values = _ntriples_objects(stream, properties)
+        else:
+            values = _turtle_objects(stream, properties)
+    return _observations(values, spec)
+
+
+def graph_observations(graph: Graph, spec: CubeSpec) -> pd.DataFrame:
+    """
+    The observations of the cube in graph (e.g. the graph of the persistent store it was
+    built in), as read_observations returns them.
+    """
+    # Literals as the tokens of an N-Triples line, so they are decoded the same way
+    values = {iri: {str(subject): obj.n3() if isinstance(obj, Literal) else str(obj)
+                    for subject, obj in graph.subject_objects(URIRef(iri))}
+              for iri in _properties(spec)}
+    return _observations(values, spec)
+
+
+def _properties(spec: CubeSpec):
+    return [str(component.property) for component in spec.dimensions + spec.measures] + [NOTATION]
+
+
+def _observations(values, spec: CubeSpec):
+    notations = values.pop(NOTATION)
+    columns = {}
+    for dimension in spec.dimensions:
+        tokens = pd.Series(values[str(dimension.property)], dtype='category')
+        prefix = str(dimension.codes)
+        codes = [_unescape(_lexical_form(notations[token])) if token in notations
+                 # A cube without code lists only has the IRI, escape() replaced spaces by
+                 # underscores before quoting the code, so an underscore reads back as a space
+                 else unquote(token[len(prefix):]).replace('_', ' ')
+                 for token in tokens.cat.categories]
+        columns[dimension.column] = tokens.cat.rename_categories(codes)
+    for measure in spec.measures:
+        tokens = pd.Series(values[str(measure.property)], dtype='category')
+        numbers = pd.Series([_lexical_form(token) for token in tokens.cat.categories])
+        numbers = numbers.astype('int64' if measure.range == XSD.integer else 'float64')
+        columns[measure.column] = pd.Series(numbers.to_numpy()[tokens.cat.codes.to_numpy()], index=tokens.index)
+    # Aligned on the subjects, only the observations have measures (a qb:Slice carries the
+    # value of its slice dimension too)
+    df = pd.DataFrame(columns).dropna(subset=spec.measure_columns)
+    dtypes = {measure.column: 'int64' if measure.range == XSD.integer else 'float64' for measure in spec.measures}
+    return df.astype(dtypes).reset_index(drop=True)
+
+
+def _open(path: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def _ntriples_objects(stream, properties):
+    """Objects of the properties by property and subject, IRIs without the brackets."""
+    predicates = {f'<{iri}>': iri for iri in properties}
+    values = {iri: {} for iri in properties}
+    for line in stream:
+        match = NT_LINE.match(line)
+        if match is None:
+            continue
+        subject, predicate, obj = match.groups()
+        iri = predicates.get(predicate)
+        if iri is not None:
+            subject = subject[1:-1] if subject.startswith('<') else subject
+            values[iri][subject] = obj[1:-1] if obj.startswith('<') else obj
+    return values
+
+
+def _turtle_objects(stream, properties):
+    """
+    Objects of the properties by property and subject, IRIs resolved and without the
+    brackets. Nested blank nodes ([ ... ]) and collections are skipped, the properties read
+    are only used on the observations and the concepts.
+    """
+    prefixes = {}
+    resolved = {}
+    values = {iri: {} for iri in properties}
+
+    def resolve(token):
+        iri = resolved.get(token)
+        if iri is None:
+            if token.startswith('<'):
+                iri = token[1:-1]
+            elif ':' in token and not token.startswith(('"', '_:')):
+                prefix, _, local = token.partition(':')
+                iri = prefixes[prefix] + local.replace('\\', '') if prefix in prefixes else token
+            else:
+                iri = token
+            resolved[token] = iri
+        return iri
+
+    expecting = 'subject'
+    subject = predicate = None
+    depth = 0
+    pending = ''
+    for line in stream:
+        if pending or line.count('"""') % 2:
+            # A long literal spans lines, its statement is tokenized once it is closed
+            pending += line
+            if pending.count('"""') % 2:
+                continue
+            line, pending = pending, ''
+        if expecting == 'subject' and depth == 0:
+            match = PREFIX.match(line)
+            if match is not None:
+                prefixes[match.group(1)] = match.group(2)
+                resolved.clear()
+                continue
+        for token in TOKEN.findall(line):
+            if token in '[(':
+                if depth == 0 and expecting == 'subject':
+                    subject = None
+                    expecting = 'predicate'
+                depth += 1
+                continue
+            if depth:
+                if token in '])':
+                    depth -= 1
+                    if depth == 0 and expecting == 'object':
+                        expecting = 'separator'
+                continue
+            if token == '.':
+                expecting = 'subject'
+            elif token == ';':
+                expecting = 'predicate'
+            elif token == ',':
+                expecting = 'object'
+            elif expecting == 'subject':
+                subject = resolve(token)
+                expecting = 'predicate'
+            elif expecting == 'predicate':
+                predicate = resolve(token) if token != 'a' else None
+                expecting = 'object'
+            elif expecting == 'object':
+                if subject is not None and predicate in values:
+                    values[predicate][subject] = resolve(token)
+                expecting = 'separator'
+    return values
+
+
+def _unescape(text: str):
+    def replace(match):
+        code = match.group(1) or match.group(2)
+        if code:
+            return chr(int(code, 16))
+        return ESCAPES.get(match.group(3), match.group(3))
+    return ESCAPE.sub(replace, text) if '\\' in text else text
+
+
+def _lexical_form(token: str):
+    if token.startswith('"'):
+        return token[1:token.rindex('"')].strip('"')
+    return token
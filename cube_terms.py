@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+from hashlib import sha1
+from itertools import repeat
+from urllib.parse import quote
+
+from rdflib import Literal, URIRef
+from rdflib.namespace import XSD
+
+from lazy_import import lazy_import
+
+pd = lazy_import('pandas')
+
+# Observation terms are computed a whole column at a time. Codes and measure values
+# repeat a lot, so every distinct value is turned into a term once and mapped back.
+
+
+def escape(value):
+    return quote(value.replace(' ','_'))
+
+
+def keyed_observation_iris(namespace, df: pd.DataFrame, columns):
+    # Derived from the dimension values only (unique per row, see validate_frame), so an
+    # observation keeps its IRI whatever the row order or the other rows of the table are
+    digests = joined_values(df, columns).map(lambda key: sha1(key.encode('utf-8')).hexdigest()[:16])
+    return (str(namespace) + 'observation-' + digests).map(URIRef)
+
+
+def joined_values(df: pd.DataFrame, columns):
+    joined = df[columns[0]].astype(str)
+    for column in columns[1:]:
+        joined = joined + '\x1f' + df[column].astype(str)
+    return joined
+
+
+class TermCache:
+    """
+    Interned URIRefs of code list values. Each distinct code is escaped and turned into
+    a URIRef once per namespace, every later row with that code reuses the same term.
+    """
+
+    def __init__(self):
+        self._terms = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._terms)
+
+    def term(self, namespace, code):
+        key = (str(namespace), code)
+        term = self._terms.get(key)
+        if term is None:
+            term = self._terms[key] = namespace[escape(code)]
+            self.misses += 1
+        else:
+            self.hits += 1
+        return term
+
+    def column(self, column: pd.Series, namespace):
+        codes = column.unique().tolist()
+        terms = {code: self.term(namespace, code) for code in codes}
+        # The repeated rows of the column are served from the same terms
+        self.hits += len(column) - len(codes)
+        return column.map(terms)
+
+    def clear(self):
+        self._terms.clear()
+        self.hits = self.misses = 0
+
+    def summary(self):
+        lookups = self.hits + self.misses
+        ratio = self.hits / lookups if lookups else 0
+        return f"Code terms: {len(self)} interned, {self.hits} hits, {self.misses} misses ({ratio:.1%} hit rate)"
+
+
+# Shared by the builder scripts, the code lists are the same in both cubes
+term_cache = TermCache()
+
+
+def code_terms(column: pd.Series, namespace):
+    return term_cache.column(column, namespace)
+
+
+def typed_literals(column: pd.Series, datatype=XSD.integer):
+    literals = {value: Literal(value, datatype=datatype) for value in column.unique().tolist()}
+    return column.map(literals)
+
+
+def add_observations(collector, subjects, properties):
+    """
+    Adds the triples of every observation in subjects with a single addN call.
+    properties are (predicate, object) pairs, the object is either one term shared
+    by all observations or a column with a term per observation.
+    """
+    predicates = [predicate for predicate, _ in properties]
+    columns = [objects if isinstance(objects, (pd.Series, pd.Index)) else repeat(objects)
+               for _, objects in properties]
+    collector.addN((subject, predicate, obj, collector)
+                   for subject, *objects in zip(subjects, *columns)
+                   for predicate, obj in zip(predicates, objects))
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+import gzip
+import os
+import re
+import time
+from collections import defaultdict, namedtuple
+from hashlib import sha1
+from urllib.parse import quote
+
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.plugin import PluginException
+from rdflib.store import NO_STORE
+
+# Output formats of a cube held in a graph and the extension of their files
+FORMATS = {
+    'turtle': '.ttl',
+    'sorted-turtle': '.ttl',
+    'nt': '.nt',
+    'nt.gz': '.nt.gz',
+}
+
+# Context the cube is kept under in a store, a persistent store reopened by a later step
+# only shows the triples of the graph with the same identifier (see store_graph)
+STORE_GRAPH = URIRef('https://example.org/resources/cube')
+
+# Local names written as prefix:name by write_sorted_turtle, anything else is written as <iri>
+LOCAL_NAME = re.compile(r'(?:[A-Za-z0-9_]|%[0-9A-Fa-f]{2})(?:[A-Za-z0-9_.\-]|%[0-9A-Fa-f]{2})*(?<!\.)')
+
+
+def ntriples_line(triple):
+    s, p, o = triple
+    return f"{s.n3()} {p.n3()} {o.n3()} .\n"
+
+
+class StreamingWriter:
+    """
+    Drop-in replacement for rdflib.Graph as the collector of the create_* functions.
+    Triples are written as N-Triples lines (which is also valid Turtle) in chunks
+    of chunk_size, so the cube is never held in memory as a whole.
+    """
+
+    def __init__(self, path: str, chunk_size: int = 10000):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.count = 0
+        self._buffer = []
+        self._stream = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, triple):
+        self._buffer.append(ntriples_line(triple))
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+        return self
+
+    def addN(self, quads):
+        # Same signature as Graph.addN, the context is this writer
+        for s, p, o, _ in quads:
+            self.add((s, p, o))
+        return self
+
+    def flush(self):
+        # The file is only opened (and truncated) once the first triples arrive
+        if self._stream is None:
+            self._stream = open(self.path, 'w', encoding='utf-8')
+        self._stream.writelines(self._buffer)
+        self.count += len(self._buffer)
+        self._buffer.clear()
+
+    def close(self):
+        if self._buffer:
+            self.flush()
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+
+class WriteStats(namedtuple('WriteStats', ['format', 'path', 'triples', 'bytes', 'seconds'])):
+    __slots__ = ()
+
+    def summary(self):
+        seconds = max(self.seconds, 1e-9)
+        return (f"Wrote {self.triples} triples ({self.bytes / 2**20:.1f} MiB) to {self.path} as {self.format} "
+                f"in {self.seconds:.2f}s: {self.triples / seconds:,.0f} triples/s, {self.bytes / 2**20 / seconds:.1f} MiB/s")
+
+
+def output_path(path: str, format: str):
+    return os.path.splitext(path)[0] + FORMATS[format]
+
+
+def write_graph(graph: Graph, path: str, format: str = 'turtle') -> WriteStats:
+    """
+    Writes graph to path and measures the write throughput.
+    turtle is rdflib's serializer, sorted-turtle a deterministic Turtle with the subjects,
+    predicates and objects sorted and stable blank node labels (diffable between runs),
+    nt line based N-Triples for bulk loading, nt.gz the same compressed.
+    """
+    start = time.perf_counter()
+    if format == 'turtle':
+        with open(path, 'wb') as f:
+            graph.serialize(f, format='turtle', encoding='utf-8')
+    elif format == 'sorted-turtle':
+        with open(path, 'w', encoding='utf-8') as f:
+            write_sorted_turtle(graph, f)
+    elif format in ('nt', 'nt.gz'):
+        opener = gzip.open if format == 'nt.gz' else open
+        with opener(path, 'wt', encoding='utf-8') as f:
+            f.writelines(f"{s.n3()} {p.n3()} {o.n3()} .\n" for s, p, o in graph)
+    else:
+        raise ValueError(f"Unknown output format '{format}'")
+    return WriteStats(format, path, len(graph), os.path.getsize(path), time.perf_counter() - start)
+
+
+def write_sorted_turtle(graph: Graph, stream):
+    prefixes = sorted(((prefix, str(namespace)) for prefix, namespace in graph.namespaces()
+                       if prefix), key=lambda item: -len(item[1]))
+    labels = _stable_bnode_labels(graph)
+    used = set()
+
+    def term(node):
+        if isinstance(node, BNode):
+            return '_:' + labels[node]
+        if isinstance(node, Literal):
+            if node.datatype is None:
+                return node.n3()
+            lexical = Literal(str(node)).n3()
+            return f"{lexical}^^{term(node.datatype)}"
+        for prefix, namespace in prefixes:
+            if node.startswith(namespace) and LOCAL_NAME.fullmatch(node[len(namespace):]):
+                used.add((prefix, namespace))
+                return f"{prefix}:{node[len(namespace):]}"
+        return node.n3()
+
+    # Predicates, types and codes repeat on every observation, each is rendered once
+    rendered = {}
+
+    def cached_term(node):
+        text = rendered.get(node)
+        if text is None:
+            text = rendered[node] = term(node)
+        return text
+
+    subjects = defaultdict(lambda: defaultdict(list))
+    for s, p, o in graph:
+        subjects[cached_term(s)][cached_term(p)].append(cached_term(o))
+
+    # Only the prefixes some term was written with
+    for prefix, namespace in sorted(used):
+        stream.write(f"@prefix {prefix}: <{namespace}> .\n")
+    stream.write("\n")
+    for subject in sorted(subjects):
+        predicates = subjects[subject]
+        lines = [f"{predicate} {', '.join(sorted(predicates[predicate]))}" for predicate in sorted(predicates)]
+        stream.write(subject + ' ' + ' ;\n    '.join(lines) + ' .\n\n')
+
+
+def _stable_bnode_labels(graph: Graph):
+    # A blank node is labelled by a hash of its neighbours that are not blank nodes
+    # (a DSD component by its structure and property), so the label does not depend on
+    # the random identifier rdflib gave it
+    bnodes = {node for triple in graph for node in (triple[0], triple[2]) if isinstance(node, BNode)}
+    signatures = {}
+    for bnode in bnodes:
+        neighbours = sorted([f"> {p.n3()} {o.n3()}" for p, o in graph.predicate_objects(bnode)
+                             if not isinstance(o, BNode)] +
+                            [f"< {s.n3()} {p.n3()}" for s, p in graph.subject_predicates(bnode)
+                             if not isinstance(s, BNode)])
+        signatures[bnode] = sha1('\n'.join(neighbours).encode('utf-8')).hexdigest()[:12]
+    labels = {}
+    used = defaultdict(int)
+    for bnode in sorted(bnodes, key=lambda node: (signatures[node], str(node))):
+        signature = signatures[bnode]
+        used[signature] += 1
+        labels[bnode] = 'b' + signature + (f"_{used[signature]}" if used[signature] > 1 else '')
+    return labels
+
+
+def store_graph(path: str) -> URIRef:
+    """
+    Context of the cube written to path in a store, named after the file without its
+    extension, so the cubes of a batch share a store without overwriting each other.
+    """
+    return URIRef(f"{STORE_GRAPH}/{quote(os.path.splitext(os.path.basename(path))[0])}")
+
+
+def open_store(name: str = 'Memory', location: str = None, clear: bool = True,
+               identifier: URIRef = STORE_GRAPH) -> Graph:
+    """
+    Graph identifier backed by the rdflib store plugin name. A persistent store (e.g.
+    BerkeleyDB, or SQLAlchemy from rdflib-sqlalchemy) is opened at location and the graph
+    is emptied unless clear is False, the cube is then built, validated and queried in it
+    without being held in memory or parsed again.
+    """
+    try:
+        graph = Graph(store=name, identifier=identifier)
+    except PluginException as e:
+        raise ValueError(f"rdflib store '{name}' is not available (BerkeleyDB needs the berkeleydb"
+                         " package, SQLAlchemy the rdflib-sqlalchemy package)") from e
+    if location is not None:
+        if graph.open(location, create=True) == NO_STORE:
+            raise ValueError(f"rdflib store '{name}' could not be opened at '{location}'")
+        if clear:
+            graph.remove((None, None, None))
+    return graph
+
+
+def load_streamed(path: str, graph: Graph = None) -> Graph:
+    return (Graph() if graph is None else graph).parse(path, format='nt')
+
+
+def load_output(path: str, graph: Graph = None) -> Graph:
+    """Parses a cube written in any of FORMATS, the format is told by the extension."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No cube at {path}, it has to be built first")
+    graph = Graph() if graph is None else graph
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as stream:
+            return graph.parse(stream, format='nt')
+    # Streamed and incremental builds write N-Triples, which is valid Turtle too
+    return graph.parse(path, format='nt' if path.endswith('.nt') else 'turtle')
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# The builders report through this logger. By default only the messages are printed as
+# they always were, with profiling (--profile or CUBE_PROFILE=1) every record is a JSON
+# object and each stage adds its wall time, peak RSS and triples per second.
+
+log = logging.getLogger('cubes')
+enabled = False
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {'time': record.created, 'level': record.levelname, 'message': record.getMessage()}
+        entry.update(getattr(record, 'fields', {}))
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def configure(profile: bool = False):
+    global enabled
+    enabled = profile or os.environ.get('CUBE_PROFILE', '') not in ('', '0')
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if enabled else logging.Formatter('%(message)s'))
+    log.handlers[:] = [handler]
+    log.setLevel(logging.DEBUG if enabled else logging.INFO)
+    log.propagate = False
+
+
+def peak_rss_mib():
+    """Peak resident set size of the process so far."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+@contextmanager
+def stage(name: str, **fields):
+    """
+    Times the block as one stage of a build. The block may store the number of triples
+    it produced under 'triples' in the yielded dict to get the throughput logged as well.
+    A stage that raises is logged too, with the exception under 'error'.
+    """
+    record = dict(fields)
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        record.update(stage=name, seconds=round(seconds, 6), peak_rss_mib=peak_rss_mib())
+        if record.get('triples'):
+            record['triples_per_second'] = round(record['triples'] / max(seconds, 1e-9))
+        status = 'failed after' if 'error' in record else 'took'
+        log.debug(f"{name} {status} {seconds:.3f}s", extra={'fields': record})
+
+
+configure()
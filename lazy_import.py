@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+import importlib.util
+import sys
+
+# pandas alone takes most of the startup of a builder script, which --help, --validate-only
+# or a failed argument check never use. The modules on that path import it through
+# lazy_import and annotate with `from __future__ import annotations`, so it is only
+# loaded once a function actually touches it.
+
+
+def lazy_import(name: str):
+    """The module name, executed on the first access to one of its attributes."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
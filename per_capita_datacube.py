@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+from rdflib import Namespace
+from rdflib.namespace import SKOS, XSD
+
+import cube_engine
+import instrumentation
+import population_datacube
+import zdravotnici_datacube
+from cube_engine import NS, NSR, OKRESY, KRAJE, KRAJE_CODES, OKRESY_CODES, Component, CubeSpec, Dataset
+from lazy_import import lazy_import
+
+pd = lazy_import('pandas')
+
+# Care providers per 1,000 inhabitants of each okres, derived from the tables the population
+# and care provider cubes are built from. The tables are joined on the okres code before any
+# triples exist, neither cube has to be written or parsed back.
+
+SPEC = CubeSpec(
+    name='per_capita',
+    output='per_capita_datacube.ttl',
+    structure=NS.perCapitaStructure,
+    dimensions=[
+        Component(NS.okres, 'okresCode', {'cs': "Okres", 'en': "County"}, "County", SKOS.Concept, OKRESY,
+                  OKRESY_CODES),
+        Component(NS.kraj, 'krajCode', {'cs': "Kraj", 'en': "County"}, "County", SKOS.Concept, KRAJE,
+                  KRAJE_CODES),
+    ],
+    measures=[
+        Component(NS.number_of_care_providers, 'providers',
+                  {'cs': "Pocet poskytovatelu pece", 'en': "Number of care providers"},
+                  "Number of care providers", XSD.integer),
+        Component(NS.mean_population, 'population', {'cs': "Stredni stav obyvatel", 'en': "Mean population"},
+                  "Mean population", XSD.integer),
+        Component(NS.care_providers_per_1000, 'per1000',
+                  {'cs': "Pocet poskytovatelu pece na 1000 obyvatel",
+                   'en': "Number of care providers per 1,000 inhabitants"},
+                  "Care providers per 1,000 inhabitants", XSD.decimal),
+    ],
+    dataset=Dataset(
+        iri=NSR.perCapitaCubeInstance,
+        labels={'cs': "Poskytovatele zdravotnich sluzeb na obyvatele", 'en': "Care providers per capita"},
+        description="Care providers per capita in Czechia",
+        comment="Number of care providers per 1,000 inhabitants in counties of Czechia",
+        issued="2023-3-12",
+        publisher="Tomas Zasadil",
+        subjects=[NS.Health, NS.Population, NS.RegionalStatictics, NS.Czechia],
+    ),
+    # The population cube has observations with the same okres and kraj codes
+    namespace=Namespace(str(NSR) + 'per-capita-'),
+)
+
+
+def load_table(args):
+    # Both tables come from the table cache when their sources did not change
+    return join_tables(population_datacube.load_table(args), zdravotnici_datacube.load_table(args))
+
+
+def join_tables(population: pd.DataFrame, providers: pd.DataFrame):
+    """
+    One row per okres of the population table with its number of care providers (of every
+    field, zero if it has none), its mean population and the providers per 1,000 inhabitants.
+    """
+    counts = providers.groupby('OkresCode')['Count'].sum()
+    okres = population['okresCode'].astype(str)
+    missing = counts.index.difference(okres)
+    if len(missing):
+        # Without a population there is nothing to divide by
+        instrumentation.log.warning(f"Care providers of {len(missing)} okresy without population left out: "
+                                    + ', '.join(missing))
+    df = pd.DataFrame({
+        'okresCode': population['okresCode'],
+        'krajCode': population['krajCode'],
+        'providers': okres.map(counts).fillna(0).astype('int64'),
+        'population': population['population'].astype('int64'),
+    })
+    df['per1000'] = (df['providers'] * 1000 / df['population']).round(4)
+    return df
+
+
+if __name__ == "__main__":
+    cube_engine.main(SPEC, load_table)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import json
+import os
+import pickle
+import tempfile
+from hashlib import sha1
+
+from lazy_import import lazy_import
+
+pd = lazy_import('pandas')
+
+# Preprocessed source tables are stored in pandas' binary pickle format, which keeps the
+# columns and their dtypes (categories included) as they are. An entry is valid while its
+# source files are unchanged: same mtime and size, or failing that the same content hash.
+# Parallel batch jobs share the entries, so both files are written aside and renamed into
+# place, the table first and its meta last, and a reader never sees a partial file.
+
+# Directory of the cache, None disables it
+directory = '.table_cache'
+
+
+def configure(path):
+    global directory
+    directory = path
+
+
+def cached(name: str, sources, key: str, load):
+    """
+    Returns the table load() returns, from the cache while none of the source files changed.
+    name identifies the table, key describes the parameters it was preprocessed with.
+    """
+    if directory is None:
+        return load()
+    table_path = os.path.join(directory, name + '.pkl')
+    meta_path = os.path.join(directory, name + '.json')
+
+    meta = _read_meta(meta_path)
+    if (meta is not None and meta['key'] == key and sorted(meta['sources']) == sorted(sources)
+            and os.path.exists(table_path)):
+        fingerprints = _current_fingerprints(sources, meta['sources'])
+        if fingerprints is not None:
+            if fingerprints != meta['sources']:
+                # Touched but not modified, the new mtimes save hashing next time
+                _write_meta(meta_path, key, fingerprints)
+            try:
+                return pd.read_pickle(table_path)
+            except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+                # Left unreadable by an interrupted run, rebuilt as if missing
+                pass
+
+    # Fingerprinted before loading, a source modified meanwhile invalidates the entry
+    fingerprints = {path: _fingerprint(path) for path in sources}
+    table = load()
+    os.makedirs(directory, exist_ok=True)
+    _replace(table_path, table.to_pickle)
+    _write_meta(meta_path, key, fingerprints)
+    return table
+
+
+def _fingerprint(path: str, digest: str = None):
+    stat = os.stat(path)
+    if digest is None:
+        digest = _hash(path)
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha1': digest}
+
+
+def _current_fingerprints(sources, stored):
+    """The fingerprints of sources if they match the stored ones, otherwise None."""
+    current = {}
+    for path in sources:
+        previous = stored.get(path)
+        if previous is None or not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        if stat.st_mtime_ns == previous['mtime_ns'] and stat.st_size == previous['size']:
+            current[path] = previous
+            continue
+        if stat.st_size != previous['size'] or _hash(path) != previous['sha1']:
+            return None
+        current[path] = _fingerprint(path, previous['sha1'])
+    return current
+
+
+def _hash(path: str):
+    digest = sha1()
+    with open(path, 'rb') as stream:
+        for block in iter(lambda: stream.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_meta(path: str):
+    try:
+        with open(path, encoding='utf-8') as stream:
+            return json.load(stream)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(path: str, key: str, fingerprints):
+    def write(temporary):
+        with open(temporary, 'w', encoding='utf-8') as stream:
+            json.dump({'key': key, 'sources': fingerprints}, stream, indent=1)
+    _replace(path, write)
+
+
+def _replace(path: str, write):
+    """Calls write(temporary path) and atomically moves the written file to path."""
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.' + os.path.basename(path))
+    os.close(descriptor)
+    try:
+        write(temporary)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
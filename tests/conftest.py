@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import table_cache  # noqa: E402
+
+# The code list tables are read from data/ relative to the repository
+os.chdir(ROOT)
+table_cache.configure(None)
+
+
+@pytest.fixture
+def providers():
+    """A small table shaped like the one zdravotnici_datacube builds its cube from."""
+    return pd.DataFrame({
+        'KrajCode': ['CZ010', 'CZ010', 'CZ020', 'CZ020', 'CZ020'],
+        'OkresCode': ['CZ0100', 'CZ0100', 'CZ0201', 'CZ0201', 'CZ0202'],
+        'DruhZarizeni': ['Lékárna', 'Nemocnice', 'Lékárna', 'Samostatná ordinace', 'Nemocnice'],
+        'Count': [12, 3, 7, 25, 1],
+    })
+
+
+@pytest.fixture
+def population():
+    """A small table shaped like the one population_datacube builds its cube from."""
+    return pd.DataFrame({
+        'okresCode': pd.Series(['CZ0100', 'CZ0201', 'CZ0202', 'CZ0203'], dtype='category'),
+        'krajCode': pd.Series(['CZ010', 'CZ020', 'CZ020', 'CZ020'], dtype='category'),
+        'population': [1_300_000, 100_000, 90_000, 160_000],
+    })
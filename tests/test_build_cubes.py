@@ -0,0 +1,65 @@
+import argparse
+import sys
+from types import SimpleNamespace
+
+import pytest
+from rdflib.plugins.stores.memory import Memory
+
+import build_cubes
+import cube_engine
+import zdravotnici_datacube
+from cube_reader import graph_observations
+from cube_writer import open_store, store_graph
+
+
+@pytest.fixture
+def args(tmp_path, providers, monkeypatch):
+    spec = zdravotnici_datacube.SPEC._replace(output=str(tmp_path / 'zdravotnici.ttl'))
+    monkeypatch.setitem(build_cubes.CUBES, 'zdravotnici', SimpleNamespace(SPEC=spec, load_table=lambda args: providers))
+    parser = argparse.ArgumentParser()
+    cube_engine.add_arguments(parser)
+    return parser.parse_args(['--no-table-cache'])
+
+
+def test_parse_job():
+    assert build_cubes.parse_job('zdravotnici:KrajCode=CZ010,OkresCode=CZ0100') == \
+        build_cubes.Job('zdravotnici', (('KrajCode', 'CZ010'), ('OkresCode', 'CZ0100')))
+    with pytest.raises(ValueError, match='unknown cube'):
+        build_cubes.parse_job('nope')
+    with pytest.raises(ValueError, match='column=value'):
+        build_cubes.parse_job('zdravotnici:KrajCode')
+
+
+def test_filtered_job_gets_its_own_output(args, tmp_path):
+    result = build_cubes.run_job(build_cubes.parse_job('zdravotnici:KrajCode=CZ020'), args)
+    assert result.error is None
+    assert result.output == str(tmp_path / 'zdravotnici-KrajCode-CZ020.ttl')
+
+
+def test_failed_jobs_are_reported(args):
+    jobs = ['zdravotnici:KrajCode=CZXXX', 'zdravotnici:Unknown=1', 'zdravotnici:KrajCode=CZ010']
+    results = [build_cubes.run_job(build_cubes.parse_job(job), args) for job in jobs]
+    report = build_cubes.format_report(results).splitlines()
+    assert 'FAILED: ValueError: job zdravotnici:KrajCode=CZXXX selects no rows' in report[0]
+    assert 'FAILED: KeyError' in report[1]
+    assert report[2].endswith(' ok')
+
+
+def test_jobs_keep_their_own_graph_in_a_shared_store(args, tmp_path):
+    # A store instance shared by the jobs stands in for a persistent store reopened at the same location
+    args.store, args.store_location = Memory(), str(tmp_path / 'store')
+    jobs = [build_cubes.parse_job(job) for job in ['zdravotnici:KrajCode=CZ010', 'zdravotnici:KrajCode=CZ020']]
+    results = [build_cubes.run_job(job, args) for job in jobs]
+    assert [result.error for result in results] == [None, None]
+    for result, kraj in zip(results, ['CZ010', 'CZ020']):
+        graph = open_store(args.store, args.store_location, clear=False, identifier=store_graph(result.output))
+        assert set(graph_observations(graph, zdravotnici_datacube.SPEC)['KrajCode']) == {kraj}
+    args.validate_only = True
+    assert [build_cubes.run_job(job, args).error for job in jobs] == [None, None]
+
+
+def test_store_location_is_not_written_by_several_processes(monkeypatch, capsys):
+    monkeypatch.setattr(sys, 'argv', ['build_cubes.py', '--store-location', 'store', '--processes', '2'])
+    with pytest.raises(SystemExit):
+        build_cubes.parse_args()
+    assert 'only be written by one process' in capsys.readouterr().err
@@ -0,0 +1,70 @@
+import argparse
+
+import pandas as pd
+import pytest
+from rdflib.plugins.stores.memory import Memory
+
+import population_datacube
+from cube_engine import as_data_cube
+from cube_query import CubeQueries, load_cube, query_parser
+from cube_writer import open_store, store_graph, write_graph
+
+
+@pytest.fixture
+def queries(providers, population):
+    return CubeQueries(providers, population)
+
+
+def test_providers_roll_up_to_kraj(queries):
+    assert queries.providers('okres').to_dict() == {'CZ0100': 15, 'CZ0201': 32, 'CZ0202': 1}
+    assert queries.providers('kraj').to_dict() == {'CZ010': 15, 'CZ020': 33}
+    assert queries.providers('kraj', 'Lékárna').to_dict() == {'CZ010': 12, 'CZ020': 7}
+    # An okres without a provider of the field counts zero
+    assert queries.providers('okres', 'Nemocnice').to_dict() == {'CZ0100': 3, 'CZ0201': 0, 'CZ0202': 1}
+
+
+def test_per_capita_keeps_areas_of_both_cubes(queries):
+    table = queries.per_capita('okres')
+    assert table.loc['CZ0201', 'per_1000'] == pytest.approx(0.32)
+    # In the population cube only
+    assert table.loc['CZ0203', 'providers'] == 0
+    kraj = queries.per_capita('kraj')
+    assert kraj.loc['CZ020', 'population'] == 350_000
+    assert kraj.loc['CZ020', 'per_1000'] == pytest.approx(33 * 1000 / 350_000)
+
+
+def test_fields(queries):
+    assert queries.fields().to_dict() == {'Lékárna': 19, 'Nemocnice': 4, 'Samostatná ordinace': 25}
+    assert queries.fields('okres', 'CZ0100').to_dict() == {'Lékárna': 12, 'Nemocnice': 3}
+    with pytest.raises(ValueError, match='CZ9999'):
+        queries.fields('kraj', 'CZ9999')
+
+
+def test_answers_are_cached(queries):
+    parser = query_parser()
+    first = queries.answer(parser.parse_args(['per-capita', 'kraj', '--field', 'Lékárna']))
+    second = queries.answer(parser.parse_args(['per-capita', 'kraj', '--field', 'Lékárna']))
+    assert first is second
+    assert queries.cache_info()['per_capita'].hits == 1
+
+
+def test_unknown_field_and_level(queries):
+    with pytest.raises(ValueError, match='Hospic'):
+        queries.providers('okres', 'Hospic')
+    with pytest.raises(ValueError, match='obec'):
+        queries.per_capita('obec')
+    assert isinstance(queries.providers('kraj'), pd.Series)
+
+
+def test_cube_is_read_from_its_graph_in_the_store(tmp_path, population):
+    path = str(tmp_path / 'population.ttl')
+    args = argparse.Namespace(store=Memory(), store_location=str(tmp_path / 'store'))
+    graph = as_data_cube(population_datacube.SPEC, population,
+                         open_store(args.store, args.store_location, identifier=store_graph(path)))
+    write_graph(graph, path)
+    from_store = load_cube(path, population_datacube.SPEC, args)
+    pd.testing.assert_frame_equal(from_store.sort_values('okresCode', ignore_index=True),
+                                  load_cube(path, population_datacube.SPEC, argparse.Namespace(store_location=None))
+                                  .sort_values('okresCode', ignore_index=True))
+    with pytest.raises(ValueError, match='has no'):
+        load_cube(str(tmp_path / 'other.ttl'), population_datacube.SPEC, args)
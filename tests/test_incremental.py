@@ -0,0 +1,84 @@
+import pandas as pd
+import pytest
+from rdflib import Graph
+from rdflib.compare import isomorphic
+
+import cube_delta
+import zdravotnici_datacube
+from cube_engine import OBORY, as_data_cube, slice_iri, update_cube
+
+# A cube patched by an incremental run has to be the cube a full build of the new table
+# writes, whatever was added, removed or changed since the previous run.
+
+
+def spec(tmp_path, slices=()):
+    return zdravotnici_datacube.SPEC._replace(output=str(tmp_path / 'zdravotnici.nt'), slices=slices)
+
+
+def changed(providers):
+    df = providers.copy()
+    df.loc[0, 'Count'] = 13
+    # A row of a new okres in another kraj with a new field, its concepts come along
+    added = pd.DataFrame({'KrajCode': ['CZ031'], 'OkresCode': ['CZ0311'], 'DruhZarizeni': ['Hospic'], 'Count': [2]})
+    # The only row of its field, the concept of the field goes with it
+    return pd.concat([df.drop(index=3), added], ignore_index=True)
+
+
+def patched(cube, before, after):
+    update_cube(cube, before, 100)
+    triples = update_cube(cube, after, 100)
+    graph = Graph().parse(cube.output, format='nt')
+    assert len(graph) == triples
+    return graph
+
+
+def test_patch_matches_full_build(tmp_path, providers):
+    cube = spec(tmp_path)
+    new = changed(providers)
+    graph = patched(cube, providers, new)
+    assert isomorphic(graph, as_data_cube(cube, new))
+    assert (OBORY['Samostatn%C3%A1_ordinace'], None, None) not in graph
+
+
+@pytest.mark.parametrize('name', ['kraj', 'obor_pece'])
+def test_patch_matches_full_build_with_slices(tmp_path, providers, name):
+    cube = spec(tmp_path, (name,))
+    new = changed(providers)
+    graph = patched(cube, providers, new)
+    assert isomorphic(graph, as_data_cube(cube, new))
+    # The slice of the new kraj is added, the one of the field that is gone removed
+    if name == 'kraj':
+        assert (None, None, slice_iri('kraj', 'CZ031')) in graph
+    else:
+        assert (slice_iri('obor_pece', 'Samostatná ordinace'), None, None) not in graph
+
+
+def test_other_slicing_rebuilds_the_cube(tmp_path, providers):
+    update_cube(spec(tmp_path), providers, 100)
+    sliced = spec(tmp_path, ('kraj',))
+    new = changed(providers)
+    update_cube(sliced, new, 100)
+    assert isomorphic(Graph().parse(sliced.output, format='nt'), as_data_cube(sliced, new))
+    assert cube_delta.load_fingerprints(sliced.output, 'other key') is None
+
+
+@pytest.mark.parametrize('slices', [(), ('obor_pece',)])
+def test_update_applied_to_previous_cube_matches_full_build(tmp_path, providers, slices):
+    cube = spec(tmp_path, slices)
+    update_cube(cube, providers, 100)
+    store = Graph().parse(cube.output, format='nt')
+    new = changed(providers)
+    update_cube(cube, new, 100)
+    with open(cube_delta.update_path(cube.output), encoding='utf-8') as stream:
+        store.update(stream.read())
+    assert isomorphic(store, as_data_cube(cube, new))
+
+
+def test_unchanged_table_leaves_the_cube_as_it_is(tmp_path, providers):
+    cube = spec(tmp_path)
+    update_cube(cube, providers, 100)
+    with open(cube.output, encoding='utf-8') as stream:
+        before = stream.read()
+    update_cube(cube, providers, 100)
+    with open(cube.output, encoding='utf-8') as stream:
+        assert stream.read() == before
@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+
+import zdravotnici_datacube
+
+COLUMNS = zdravotnici_datacube.GROUP_COLUMNS
+
+
+@pytest.fixture
+def facilities(tmp_path):
+    """A zdravotnici.csv with one row per facility, in no particular order."""
+    rows = pd.DataFrame({
+        'ZdravotnickeZarizeniId': range(9),
+        'KrajCode': ['CZ020', 'CZ010', 'CZ020', 'CZ010', 'CZ020', None, 'CZ010', 'CZ020', 'CZ020'],
+        'OkresCode': ['CZ0201', 'CZ0100', 'CZ0202', 'CZ0100', 'CZ0201', 'CZ0201', 'CZ0100', 'CZ0201', 'CZ0202'],
+        'DruhZarizeni': ['Lékárna', 'Nemocnice', 'Lékárna', 'Nemocnice', 'Lékárna', 'Lékárna', 'Lékárna',
+                         'Samostatná ordinace', 'Lékárna'],
+    })
+    path = tmp_path / 'zdravotnici.csv'
+    rows.to_csv(path, index=False)
+    return str(path)
+
+
+def test_counts_do_not_depend_on_chunk_size(facilities):
+    whole = zdravotnici_datacube.count_groups(facilities, COLUMNS, 1000)
+    for chunksize in [1, 2, 4]:
+        pd.testing.assert_frame_equal(zdravotnici_datacube.count_groups(facilities, COLUMNS, chunksize), whole)
+
+
+def test_counts_match_a_single_group_by(facilities):
+    expected = pd.read_csv(facilities, usecols=COLUMNS, dtype=str).groupby(COLUMNS).size().reset_index(name='Count')
+    pd.testing.assert_frame_equal(zdravotnici_datacube.count_groups(facilities, COLUMNS, 3), expected)
+    # Rows with a missing code are not counted
+    assert expected['Count'].sum() == 8
@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+import per_capita_datacube
+import validator
+from cube_engine import as_data_cube
+from cube_reader import read_observations
+from cube_writer import FORMATS, output_path, write_graph
+
+SPEC = per_capita_datacube.SPEC
+
+
+def test_join_on_okres(population, providers):
+    df = per_capita_datacube.join_tables(population, providers).set_index('okresCode')
+    # Every field of an okres counts, an okres without providers has none
+    assert df.loc['CZ0100', 'providers'] == 15
+    assert df.loc['CZ0201', 'providers'] == 32
+    assert df.loc['CZ0203', 'providers'] == 0
+    assert df.loc['CZ0201', 'per1000'] == pytest.approx(0.32)
+    assert len(df) == len(population)
+
+
+def test_providers_without_population_are_left_out(population, providers):
+    df = per_capita_datacube.join_tables(population[population['okresCode'] != 'CZ0202'], providers)
+    assert 'CZ0202' not in set(df['okresCode'].astype(str))
+
+
+def test_cube_is_well_formed(population, providers):
+    graph = as_data_cube(SPEC, per_capita_datacube.join_tables(population, providers))
+    assert all(result.passed for result in validator.check(graph))
+
+
+@pytest.mark.parametrize('format', list(FORMATS))
+def test_decimal_measures_round_trip(tmp_path, providers, population, format):
+    table = per_capita_datacube.join_tables(population, providers)
+    path = output_path(str(tmp_path / 'cube.ttl'), format)
+    write_graph(as_data_cube(SPEC, table), path, format)
+    df = read_observations(path, SPEC)
+    assert df['per1000'].dtype == 'float64'
+    columns = SPEC.dimension_columns + SPEC.measure_columns
+    expected = table[columns].astype({column: str for column in SPEC.dimension_columns})
+    actual = df[columns].astype({column: str for column in SPEC.dimension_columns})
+    pd.testing.assert_frame_equal(actual.sort_values('okresCode').reset_index(drop=True),
+                                  expected.sort_values('okresCode').reset_index(drop=True))
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+import cube_engine
+import population_datacube
+
+
+def test_resolve_codes_keeps_row_order():
+    table = pd.DataFrame({'key': [1, 2, 3], 'value': ['a', 'b', 'c']})
+    codes = pd.Series([3, 1, 3, 2], name='kod')
+    resolved = cube_engine.resolve_codes(codes, table, 'key', 'value')
+    assert resolved.tolist() == ['c', 'a', 'c', 'b']
+    assert resolved.dtype == 'category'
+
+
+def test_resolve_codes_reports_unmapped_codes():
+    table = pd.DataFrame({'key': [1, 2], 'value': ['a', 'b']})
+    codes = pd.Series([1, 7, 7, 9], name='kod')
+    with pytest.raises(ValueError, match=r'2 kod codes: 7 \(2 rows\), 9 \(1 rows\)'):
+        cube_engine.resolve_codes(codes, table, 'key', 'value')
+
+
+def test_map_codes_resolves_okres_and_kraj():
+    df = population_datacube.map_codes(pd.DataFrame({'vuzemi_kod': [40924, 40169], 'hodnota': [1_300_000, 100_000]}))
+    assert df['okresCode'].astype(str).tolist() == ['CZ0100', 'CZ0201']
+    assert df['krajCode'].astype(str).tolist() == ['CZ010', 'CZ020']
+    assert df['population'].tolist() == [1_300_000, 100_000]
+
+
+def test_read_filtered_keeps_only_matching_rows(tmp_path):
+    path = tmp_path / 'population.csv'
+    pd.DataFrame({
+        'idhod': range(6),
+        'vuk': ['DEM0004', 'DEM0001', 'DEM0004', 'DEM0004', 'DEM0002', 'DEM0004'],
+        'vuzemi_cis': [101, 101, 100, 101, 101, 101],
+        'vuzemi_kod': [40924, 40924, 3018, 40169, 40169, 40177],
+        'hodnota': [10, 20, 30, 40, 50, 60],
+    }).to_csv(path, index=False)
+    columns = ['vuzemi_kod', 'hodnota']
+    for chunksize in [1, 4, 100]:
+        df = population_datacube.read_filtered(str(path), columns, population_datacube.FILTERS, chunksize)
+        assert list(df.columns) == columns
+        assert df.values.tolist() == [[40924, 10], [40169, 40], [40177, 60]]
+
+
+def test_read_filtered_without_matches(tmp_path):
+    path = tmp_path / 'population.csv'
+    pd.DataFrame({'vuk': ['DEM0001'], 'vuzemi_cis': [101], 'vuzemi_kod': [40924], 'hodnota': [1]}).to_csv(path, index=False)
+    df = population_datacube.read_filtered(str(path), ['vuzemi_kod', 'hodnota'], population_datacube.FILTERS, 10)
+    assert df.empty
+    assert list(df.columns) == ['vuzemi_kod', 'hodnota']
@@ -0,0 +1,73 @@
+import pandas as pd
+import pytest
+
+import zdravotnici_datacube
+from cube_engine import as_data_cube
+from cube_reader import read_observations
+from cube_writer import FORMATS, output_path, write_graph
+
+# A cube written in any of the output formats reads back into the table it was built from.
+
+SPEC = zdravotnici_datacube.SPEC
+
+
+def normalized(df, spec):
+    df = df[spec.dimension_columns + spec.measure_columns].copy()
+    for column in spec.dimension_columns:
+        df[column] = df[column].astype(str)
+    return df.sort_values(spec.dimension_columns).reset_index(drop=True)
+
+
+def round_trip(tmp_path, spec, df, format):
+    path = output_path(str(tmp_path / 'cube.ttl'), format)
+    stats = write_graph(as_data_cube(spec, df), path, format)
+    assert stats.triples > 0
+    return read_observations(path, spec)
+
+
+@pytest.mark.parametrize('format', list(FORMATS))
+def test_round_trip(tmp_path, providers, format):
+    # Codes with underscores, quotes and backslashes come back from their skos:notation
+    providers.loc[4, 'DruhZarizeni'] = 'x_y "z" \\ w'
+    df = round_trip(tmp_path, SPEC, providers, format)
+    assert df['Count'].dtype == 'int64'
+    pd.testing.assert_frame_equal(normalized(df, SPEC), normalized(providers, SPEC))
+
+
+def test_hand_written_turtle(tmp_path):
+    # Forms rdflib does not write: SPARQL style prefixes, object lists, nested blank nodes
+    # and long literals with statement punctuation inside. Without notations the codes are
+    # taken from the IRIs.
+    path = tmp_path / 'cube.ttl'
+    path.write_text('''PREFIX ont: <https://example.org/ontology#>
+@prefix okres: <https://example.org/okresy/> .
+@prefix kraj: <https://example.org/kraje/> .
+@prefix obor: <https://example.org/obor-pece/> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+
+<https://example.org/resources/a> a <http://purl.org/linked-data/cube#Observation> ;
+    rdfs:comment """Two lines ; with a . and
+a [ bracket""" , "short" ;
+    ont:okres okres:CZ0100 ; ont:kraj kraj:CZ010 ;
+    rdfs:seeAlso [ ont:okres okres:CZ0201 ; ont:number_of_care_providers 99 ] ;
+    ont:obor_pece obor:L%C3%A9k%C3%A1rna ;
+    ont:number_of_care_providers 12 .
+<https://example.org/resources/b> ont:okres okres:CZ0202 ; ont:kraj kraj:CZ020 ;
+    ont:obor_pece <https://example.org/obor-pece/Samostatn%C3%A1_ordinace> ;
+    ont:number_of_care_providers "25"^^<http://www.w3.org/2001/XMLSchema#integer> .
+obor:L%C3%A9k%C3%A1rna <http://www.w3.org/2004/02/skos/core#notation> "L\\u00e9k\\u00e1rna" .
+''', encoding='utf-8')
+    expected = pd.DataFrame({
+        'KrajCode': ['CZ010', 'CZ020'],
+        'OkresCode': ['CZ0100', 'CZ0202'],
+        'DruhZarizeni': ['Lékárna', 'Samostatná ordinace'],
+        'Count': [12, 25],
+    })
+    pd.testing.assert_frame_equal(normalized(read_observations(str(path), SPEC), SPEC), normalized(expected, SPEC))
+
+
+@pytest.mark.parametrize('format', ['turtle', 'nt'])
+def test_slices_are_not_read_as_observations(tmp_path, providers, format):
+    spec = SPEC._replace(slices=('kraj', 'obor_pece'))
+    df = round_trip(tmp_path, spec, providers, format)
+    pd.testing.assert_frame_equal(normalized(df, spec), normalized(providers, spec))
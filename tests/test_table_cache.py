@@ -0,0 +1,80 @@
+import os
+
+import pandas as pd
+import pytest
+
+import table_cache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    table_cache.configure(str(tmp_path / 'cache'))
+    yield tmp_path
+    table_cache.configure(None)
+
+
+class Loader:
+    """Counts how often the table had to be loaded."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return pd.DataFrame({'code': pd.Series(['a', 'b'], dtype='category'), 'value': [self.calls, 2]})
+
+
+def source(cache, text):
+    path = cache / 'source.csv'
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def test_unchanged_source_is_read_from_the_cache(cache):
+    path = source(cache, 'a,b\n')
+    load = Loader()
+    first = table_cache.cached('t', [path], 'k', load)
+    second = table_cache.cached('t', [path], 'k', load)
+    assert load.calls == 1
+    pd.testing.assert_frame_equal(first, second)
+    assert second['code'].dtype == 'category'
+
+
+def test_touched_source_with_the_same_content_is_still_valid(cache):
+    path = source(cache, 'a,b\n')
+    load = Loader()
+    table_cache.cached('t', [path], 'k', load)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    table_cache.cached('t', [path], 'k', load)
+    assert load.calls == 1
+
+
+def test_modified_source_invalidates_the_entry(cache):
+    path = source(cache, 'a,b\n')
+    load = Loader()
+    table_cache.cached('t', [path], 'k', load)
+    stat = os.stat(path)
+    # Same size and mtime would be trusted, the content hash is only checked on a new mtime
+    source(cache, 'a,c\n')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert table_cache.cached('t', [path], 'k', load)['value'][0] == 2
+    assert load.calls == 2
+
+
+def test_other_key_invalidates_the_entry(cache):
+    path = source(cache, 'a,b\n')
+    load = Loader()
+    table_cache.cached('t', [path], 'k', load)
+    table_cache.cached('t', [path], 'other', load)
+    assert load.calls == 2
+
+
+def test_unreadable_pickle_is_rebuilt(cache):
+    path = source(cache, 'a,b\n')
+    load = Loader()
+    table_cache.cached('t', [path], 'k', load)
+    (cache / 'cache' / 't.pkl').write_bytes(b'\x80\x05truncated')
+    assert table_cache.cached('t', [path], 'k', load)['value'][0] == 2
+    assert table_cache.cached('t', [path], 'k', load)['value'][0] == 2
+    assert load.calls == 2
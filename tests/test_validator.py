@@ -0,0 +1,158 @@
+import argparse
+
+import pandas as pd
+import pytest
+from rdflib import BNode, Literal, URIRef
+from rdflib.namespace import QB, RDF, SKOS
+
+import cube_engine
+import validator
+import zdravotnici_datacube
+from cube_engine import NS, NSR, OKRESY, RDFS, as_data_cube, validation_graph
+
+# Every check is run by both engines on a well formed cube and on variants broken in one
+# place, the native checks have to reach the verdicts of the SPARQL reference queries.
+
+SPEC = zdravotnici_datacube.SPEC
+
+
+def failed(graph, engine):
+    return {result.name for result in validator.check(graph, engine) if not result.passed}
+
+
+def first_observation(graph):
+    return min(graph.subjects(RDF.type, QB.Observation))
+
+
+def second_dataset(graph):
+    graph.add((first_observation(graph), QB.dataSet, NSR.otherDataset))
+
+
+def missing_dimension(graph):
+    graph.remove((first_observation(graph), NS.okres, None))
+
+
+def duplicate_observation(graph):
+    obs = first_observation(graph)
+    for predicate, obj in list(graph.predicate_objects(obs)):
+        graph.add((URIRef(str(obs) + '-copy'), predicate, obj))
+
+
+def missing_measure(graph):
+    graph.remove((first_observation(graph), NS.number_of_care_providers, None))
+
+
+def dimension_without_range(graph):
+    graph.remove((NS.kraj, RDFS.range, None))
+
+
+def unknown_code(graph):
+    graph.set((first_observation(graph), NS.okres, OKRESY.CZ9999))
+
+
+def dimension_without_code_list(graph):
+    graph.remove((NS.okres, QB.codeList, None))
+
+
+def code_outside_hierarchy(graph):
+    code = graph.value(first_observation(graph), NS.okres)
+    graph.remove((None, SKOS.narrower, code))
+
+
+def slice_key_outside_dsd(graph):
+    graph.add((NSR.orphanKey, RDF.type, QB.SliceKey))
+
+
+def measure_type_dimension(graph):
+    component = BNode()
+    graph.add((SPEC.structure, QB.component, component))
+    graph.add((component, QB.componentProperty, QB.measureType))
+    graph.add((first_observation(graph), QB.measureType, NS.mean_population))
+
+
+def missing_required_attribute(graph):
+    component = BNode()
+    graph.add((SPEC.structure, QB.component, component))
+    graph.add((component, QB.componentProperty, NS.status))
+    graph.add((component, QB.componentRequired, Literal(True)))
+    graph.add((NS.status, RDF.type, QB.AttributeProperty))
+
+
+BROKEN = [
+    (second_dataset, 'IC-1'),
+    (missing_dimension, 'IC-11'),
+    (duplicate_observation, 'IC-12'),
+    (missing_measure, 'IC-14'),
+    (dimension_without_range, 'IC-4'),
+    (missing_required_attribute, 'IC-13'),
+    (measure_type_dimension, 'IC-15'),
+    (dimension_without_code_list, 'IC-5'),
+    (unknown_code, 'IC-19'),
+    (code_outside_hierarchy, 'IC-20'),
+    (slice_key_outside_dsd, 'IC-7'),
+]
+
+
+@pytest.mark.parametrize('slices', [(), ('kraj', 'obor_pece')])
+def test_well_formed_cube_passes(providers, slices):
+    graph = as_data_cube(SPEC._replace(slices=slices), providers)
+    assert failed(graph, 'native') == set()
+    assert failed(graph, 'sparql') == set()
+
+
+@pytest.mark.parametrize('break_graph, check', BROKEN, ids=[check for _, check in BROKEN])
+def test_engines_agree_on_broken_cube(providers, break_graph, check):
+    graph = as_data_cube(SPEC, providers)
+    break_graph(graph)
+    native = failed(graph, 'native')
+    assert check in native
+    assert native == failed(graph, 'sparql')
+
+
+def test_frame_checks_reject_bad_rows(providers):
+    with pytest.raises(ValueError, match='IC-12'):
+        validator.validate_frame(providers.iloc[[0, 0]], SPEC.dimension_columns, SPEC.measure_columns)
+    with pytest.raises(ValueError, match='IC-14'):
+        validator.validate_frame(providers.assign(Count=None), SPEC.dimension_columns, SPEC.measure_columns)
+    with pytest.raises(ValueError, match='IC-11'):
+        validator.validate_frame(providers.assign(OkresCode=None), SPEC.dimension_columns, SPEC.measure_columns)
+
+
+def test_parallel_checks_agree(providers):
+    graph = as_data_cube(SPEC, providers)
+    duplicate_observation(graph)
+    assert failed(graph, 'native') == {result.name for result in validator.check(graph, 'native', processes=2)
+                                       if not result.passed}
+
+
+def test_validation_graph_uses_every_code(providers):
+    # Every value of the added row is used by another row already
+    df = pd.concat([providers, pd.DataFrame({'KrajCode': ['CZ020'], 'OkresCode': ['CZ0202'],
+                                             'DruhZarizeni': ['Lékárna'], 'Count': [4]})], ignore_index=True)
+    spec = SPEC._replace(slices=('kraj', 'obor_pece'))
+    sample, cube = validation_graph(spec, df), as_data_cube(spec, df)
+    assert failed(sample, 'native') == failed(sample, 'sparql') == set()
+    assert len(set(sample.subjects(RDF.type, QB.Observation))) == len(providers)
+    # The DSD components are blank nodes, every other triple is one the cube has
+    assert {(s, p, o) for s, p, o in sample if not isinstance(s, BNode) and not isinstance(o, BNode)} <= set(cube)
+    for dimension in spec.dimensions:
+        assert set(sample.objects(None, dimension.property)) == set(cube.objects(None, dimension.property))
+
+
+def test_validation_graph_catches_unknown_code(providers):
+    graph = validation_graph(SPEC, providers.assign(OkresCode=['CZ0100', 'CZ0100', 'CZ0201', 'CZ0201', 'CZ9999']))
+    assert {'IC-19', 'IC-20'} <= failed(graph, 'native')
+
+
+def test_streamed_cube_is_not_parsed_back(tmp_path, providers, monkeypatch):
+    def load_streamed(*args):
+        raise AssertionError('the streamed cube was parsed back')
+
+    monkeypatch.setattr(cube_engine, 'load_streamed', load_streamed)
+    parser = argparse.ArgumentParser()
+    cube_engine.add_arguments(parser)
+    spec = SPEC._replace(output=str(tmp_path / 'zdravotnici.nt'))
+    for mode in ['--stream', '--incremental']:
+        cube_engine.build(spec, providers, parser.parse_args([mode, '--slice-by', 'kraj']))
+    with pytest.raises(AssertionError, match='not well formed'):
+        cube_engine.build(spec, providers.assign(KrajCode='CZ099'), parser.parse_args(['--stream']))
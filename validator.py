@@ -0,0 +1,576 @@
+#!/usr/bin/env python3
+import multiprocessing
+import time
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from string import Template
+
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.namespace import OWL, QB, RDF, RDFS, SKOS
+from rdflib.plugins.stores.memory import Memory, SimpleMemory
+
+import constrains
+
+# Names of the queries in constrains.integrity_queries, in the same order
+CHECK_NAMES = [
+    'IC-1', 'IC-2', 'IC-3', 'IC-4', 'IC-5', 'IC-6', 'IC-7', 'IC-8', 'IC-9', 'IC-10', 'IC-11',
+    'IC-12', 'IC-13', 'IC-14', 'IC-15', 'IC-16', 'IC-17', 'IC-18', 'IC-19', 'IC-19b',
+    'IC-20', 'IC-21',
+]
+assert len(CHECK_NAMES) == len(constrains.integrity_queries)
+
+TRUE = Literal(True)
+FALSE = Literal(False)
+
+
+# Each check returns the offending nodes, an empty list means the constraint holds.
+# They give the same answer as the corresponding SPARQL ASK query, but look the
+# triples up through the store indexes instead of evaluating joins.
+
+def ic1_unique_dataset(graph: Graph):
+    return [obs for obs in set(graph.subjects(RDF.type, QB.Observation))
+            if len(set(graph.objects(obs, QB.dataSet))) != 1]
+
+
+def ic2_unique_dsd(graph: Graph):
+    return [dataset for dataset in set(graph.subjects(RDF.type, QB.DataSet))
+            if len(set(graph.objects(dataset, QB.structure))) != 1]
+
+
+def ic3_dsd_includes_measure(graph: Graph):
+    return [dsd for dsd in set(graph.subjects(RDF.type, QB.DataStructureDefinition))
+            if not any(_is_a(graph, prop, QB.MeasureProperty)
+                       for prop in _path(graph, dsd, QB.component, QB.componentProperty))]
+
+
+def ic4_dimensions_have_range(graph: Graph):
+    return [dim for dim in set(graph.subjects(RDF.type, QB.DimensionProperty))
+            if _missing(graph, dim, RDFS.range)]
+
+
+def ic5_concept_dimensions_have_code_lists(graph: Graph):
+    return [dim for dim in set(graph.subjects(RDF.type, QB.DimensionProperty))
+            if (dim, RDFS.range, SKOS.Concept) in graph and _missing(graph, dim, QB.codeList)]
+
+
+def ic6_only_attributes_may_be_optional(graph: Graph):
+    return [prop for spec in set(graph.subjects(QB.componentRequired, FALSE))
+            if _has_subject(graph, QB.component, spec)
+            for prop in graph.objects(spec, QB.componentProperty)
+            if not _is_a(graph, prop, QB.AttributeProperty)]
+
+
+def ic7_slice_keys_in_dsd(graph: Graph):
+    return [key for key in set(graph.subjects(RDF.type, QB.SliceKey))
+            if not any(_is_a(graph, dsd, QB.DataStructureDefinition) for dsd in graph.subjects(QB.sliceKey, key))]
+
+
+def ic8_slice_keys_consistent_with_dsd(graph: Graph):
+    offending = []
+    for key in set(graph.subjects(RDF.type, QB.SliceKey)):
+        for prop in set(graph.objects(key, QB.componentProperty)):
+            for dsd in set(graph.subjects(QB.sliceKey, key)):
+                if prop not in _path(graph, dsd, QB.component, QB.componentProperty):
+                    offending.append(key)
+    return offending
+
+
+def ic9_unique_slice_structure(graph: Graph):
+    return [slice_ for slice_ in set(graph.subjects(RDF.type, QB.Slice))
+            if len(set(graph.objects(slice_, QB.sliceStructure))) != 1]
+
+
+def ic10_slice_dimensions_complete(graph: Graph):
+    return [slice_ for slice_, key in graph.subject_objects(QB.sliceStructure)
+            for dim in graph.objects(key, QB.componentProperty)
+            if _missing(graph, slice_, dim)]
+
+
+def ic11_all_dimensions_required(graph: Graph):
+    index = _DatasetIndex(graph)
+    return [obs for obs, dataset in graph.subject_objects(QB.dataSet)
+            for dim in index.dimensions(dataset)
+            if _missing(graph, obs, dim)]
+
+
+def ic12_no_duplicate_observations(graph: Graph):
+    index = _DatasetIndex(graph)
+    datasets_of = defaultdict(set)
+    for obs, dataset in graph.subject_objects(QB.dataSet):
+        datasets_of[obs].add(dataset)
+    members = defaultdict(list)
+    for obs, datasets in datasets_of.items():
+        for dataset in datasets:
+            members[dataset].append(obs)
+
+    offending = []
+    for dataset, observations in members.items():
+        dimensions = index.dimensions(dataset)
+        if not dimensions:
+            continue
+        # Observations with exactly one value per dimension are duplicates exactly when
+        # their value tuples are equal, so they are found by hashing. The rest (missing or
+        # repeated values, several data sets) keep the pairwise semantics of the query.
+        seen = {}
+        irregular = []
+        for obs in observations:
+            key = _dimension_key(graph, obs, dimensions) if len(datasets_of[obs]) == 1 else None
+            if key is None:
+                irregular.append(obs)
+            elif key in seen:
+                offending.append(obs)
+            else:
+                seen[key] = obs
+        for obs in irregular:
+            for other in observations:
+                if other == obs:
+                    continue
+                shared = datasets_of[obs] & datasets_of[other]
+                shared_dimensions = set().union(*(index.dimensions(d) for d in shared))
+                if _all_equal(graph, obs, other, shared_dimensions):
+                    offending.append(obs)
+                    break
+    return offending
+
+
+def ic13_required_attributes(graph: Graph):
+    index = _DatasetIndex(graph)
+    return [obs for obs, dataset in graph.subject_objects(QB.dataSet)
+            for attr in index.required_attributes(dataset)
+            if _missing(graph, obs, attr)]
+
+
+def ic14_all_measures_present(graph: Graph):
+    index = _StructureIndex(graph)
+    offending = []
+    for dataset, dsd in graph.subject_objects(QB.structure):
+        if index.uses_measure_type(dsd):
+            continue
+        measures = index.measures(dsd)
+        for obs in graph.subjects(QB.dataSet, dataset):
+            if any(_missing(graph, obs, measure) for measure in measures):
+                offending.append(obs)
+    return offending
+
+
+def ic15_measure_dimension_consistent(graph: Graph):
+    # Only observations with a qb:measureType in a cube whose DSD has one can violate it
+    if (None, QB.componentProperty, QB.measureType) not in graph:
+        return []
+    index = _StructureIndex(graph)
+    return [obs for obs, measure in graph.subject_objects(QB.measureType)
+            if any(index.uses_measure_type(dsd) for dsd in _path(graph, obs, QB.dataSet, QB.structure))
+            and _missing(graph, obs, measure)]
+
+
+def ic16_single_measure_on_measure_dimension_observation(graph: Graph):
+    if (None, QB.componentProperty, QB.measureType) not in graph:
+        return []
+    index = _StructureIndex(graph)
+    offending = []
+    for obs, measure in graph.subject_objects(QB.measureType):
+        used = set(graph.predicates(obs, None))
+        for dsd in _path(graph, obs, QB.dataSet, QB.structure):
+            if index.uses_measure_type(dsd) and any(other != measure for other in index.measures(dsd) & used):
+                offending.append(obs)
+    return offending
+
+
+def ic17_all_measures_present_in_measures_dimension_cube(graph: Graph):
+    num_measures = {}
+    for dsd, component in graph.subject_objects(QB.component):
+        for measure in graph.objects(component, QB.componentProperty):
+            if _is_a(graph, measure, QB.MeasureProperty):
+                num_measures[dsd] = num_measures.get(dsd, 0) + 1
+
+    offending = []
+    for obs1 in set(graph.subjects(QB.measureType, None)):
+        counts = Counter()
+        for dsd in _path(graph, obs1, QB.dataSet, QB.structure):
+            if dsd not in num_measures:
+                continue
+            dimensions = [dim for dim in _path(graph, dsd, QB.component, QB.componentProperty)
+                          if dim != QB.measureType and _is_a(graph, dim, QB.DimensionProperty)]
+            for dataset in graph.objects(obs1, QB.dataSet):
+                for _ in graph.objects(obs1, QB.measureType):
+                    for obs2 in graph.subjects(QB.dataSet, dataset):
+                        if _any_different(graph, obs1, obs2, dimensions):
+                            continue
+                        counts[num_measures[dsd]] += len(set(graph.objects(obs2, QB.measureType)))
+        if any(count != expected for expected, count in counts.items()):
+            offending.append(obs1)
+    return offending
+
+
+def ic18_consistent_dataset_links(graph: Graph):
+    return [obs for dataset, slice_ in graph.subject_objects(QB.slice)
+            for obs in graph.objects(slice_, QB.observation)
+            if (obs, QB.dataSet, dataset) not in graph]
+
+
+def ic19_codes_from_concept_scheme(graph: Graph):
+    index = _CodeListIndex(graph)
+    return [value for values, code_list in _coded_values(graph, SKOS.ConceptScheme)
+            for value in values - index.scheme(code_list)]
+
+
+def ic19b_codes_from_collection(graph: Graph):
+    index = _CodeListIndex(graph)
+    return [value for values, code_list in _coded_values(graph, SKOS.Collection)
+            for value in values - index.collection(code_list)]
+
+
+def ic20_codes_from_hierarchy(graph: Graph):
+    return _hierarchy_violations(graph, inverse=False)
+
+
+def ic21_codes_from_inverse_hierarchy(graph: Graph):
+    return _hierarchy_violations(graph, inverse=True)
+
+
+native_checks = [
+    ic1_unique_dataset,
+    ic2_unique_dsd,
+    ic3_dsd_includes_measure,
+    ic4_dimensions_have_range,
+    ic5_concept_dimensions_have_code_lists,
+    ic6_only_attributes_may_be_optional,
+    ic7_slice_keys_in_dsd,
+    ic8_slice_keys_consistent_with_dsd,
+    ic9_unique_slice_structure,
+    ic10_slice_dimensions_complete,
+    ic11_all_dimensions_required,
+    ic12_no_duplicate_observations,
+    ic13_required_attributes,
+    ic14_all_measures_present,
+    ic15_measure_dimension_consistent,
+    ic16_single_measure_on_measure_dimension_observation,
+    ic17_all_measures_present_in_measures_dimension_cube,
+    ic18_consistent_dataset_links,
+    ic19_codes_from_concept_scheme,
+    ic19b_codes_from_collection,
+    ic20_codes_from_hierarchy,
+    ic21_codes_from_inverse_hierarchy,
+]
+assert len(native_checks) == len(CHECK_NAMES)
+
+
+# Constraints on observations that validate_frame already enforces on the source table
+FRAME_CHECKS = {'IC-1', 'IC-11', 'IC-12', 'IC-14'}
+
+
+def validate_frame(df, dimensions, measures, max_rows: int = 20):
+    """
+    Checks the table an observation per row is built from, before any triples exist.
+    Every row becomes exactly one observation with exactly one qb:dataSet (IC-1), so
+    it remains to check that no dimension (IC-11) or measure (IC-14) value is missing
+    and that no two rows share the same dimension values (IC-12).
+    Raises ValueError listing the offending rows.
+    """
+    problems = [
+        ('IC-11 missing dimension value', df[dimensions].isna().any(axis=1)),
+        ('IC-14 missing measure value', df[measures].isna().any(axis=1)),
+        ('IC-12 duplicate dimension values', df.duplicated(dimensions, keep=False)),
+    ]
+    messages = []
+    for description, mask in problems:
+        if mask.any():
+            rows = df.loc[mask, dimensions + measures]
+            messages.append(f"{description} in {len(rows)} rows:\n{rows.head(max_rows).to_string()}")
+    if messages:
+        raise ValueError('The datacube would not be well formed\n' + '\n'.join(messages))
+
+
+def sparql_queries(graph: Graph):
+    """
+    Yields (name, query) pairs of the reference SPARQL implementation. IC-20 and IC-21
+    are templates over the parent-child property $p, they get one query per property.
+    """
+    for name, query in zip(CHECK_NAMES, constrains.integrity_queries):
+        if '$p' not in query:
+            yield name, query
+            continue
+        properties = _parent_child_properties(graph, inverse=name == 'IC-21')
+        # Without any parent-child property the template itself is a query that never matches
+        for prop in properties or ['$p']:
+            yield name, Template(query).substitute(p=str(prop))
+
+
+CheckResult = namedtuple('CheckResult', ['name', 'passed', 'seconds'])
+
+# Graph the worker processes of a parallel check run on
+_worker_graph = None
+
+
+@lru_cache(maxsize=None)
+def prepared_query(query: str):
+    """The query parsed and compiled once per process, every later check reuses it."""
+    # The SPARQL engine is only imported by the reference checks
+    from rdflib.plugins.sparql import prepareQuery
+    return prepareQuery(query, initNs={'qb': QB, 'skos': SKOS, 'owl': OWL})
+
+
+def prepare_queries():
+    # Compiled before the workers of a batch are forked, so they inherit the compiled queries
+    for query in constrains.integrity_queries:
+        if '$p' not in query:
+            prepared_query(query)
+
+
+def run_sparql_check(graph: Graph, query: str) -> bool:
+    return not graph.query(prepared_query(query)).askAnswer
+
+
+def run_native_check(graph: Graph, name: str) -> bool:
+    return not native_checks[CHECK_NAMES.index(name)](graph)
+
+
+def check(graph: Graph, engine: str = 'native', skip=(), processes: int = 1):
+    """
+    Runs every integrity constraint not named in skip and returns a CheckResult for each.
+    With processes > 1 the checks are spread over a process pool, the workers either
+    inherit an in-memory graph (fork) or parse it once from an N-Triples serialization.
+    The latter is also used for persistent stores, whose handles can't be shared.
+    """
+    if engine == 'native':
+        tasks = [(name, None) for name in CHECK_NAMES if name not in skip]
+    elif engine == 'sparql':
+        tasks = [(name, query) for name, query in sparql_queries(graph) if name not in skip]
+    else:
+        raise ValueError(f"Unknown validation engine '{engine}'")
+
+    if processes <= 1 or len(tasks) <= 1:
+        return [_run_task(graph, name, query) for name, query in tasks]
+
+    for _, query in tasks:
+        if query is not None:
+            prepared_query(query)
+    global _worker_graph
+    if 'fork' in multiprocessing.get_all_start_methods() and isinstance(graph.store, (Memory, SimpleMemory)):
+        context = multiprocessing.get_context('fork')
+        _worker_graph, serialized = graph, None
+    else:
+        context = multiprocessing.get_context()
+        serialized = graph.serialize(format='nt')
+    try:
+        with ProcessPoolExecutor(min(processes, len(tasks)), mp_context=context,
+                                 initializer=_init_worker, initargs=(serialized,)) as pool:
+            return list(pool.map(_run_worker_task, tasks))
+    finally:
+        _worker_graph = None
+
+
+def format_report(results):
+    lines = [f"{result.name:<8} {'ok' if result.passed else 'FAILED':<6} {result.seconds:8.3f}s"
+             for result in results]
+    return '\n'.join(lines)
+
+
+def _run_task(graph: Graph, name: str, query):
+    start = time.perf_counter()
+    passed = run_native_check(graph, name) if query is None else run_sparql_check(graph, query)
+    return CheckResult(name, passed, time.perf_counter() - start)
+
+
+def _init_worker(serialized):
+    global _worker_graph
+    if serialized is not None:
+        _worker_graph = Graph().parse(data=serialized, format='nt')
+
+
+def _run_worker_task(task):
+    return _run_task(_worker_graph, *task)
+
+
+class _DatasetIndex:
+    """Dimension and required attribute properties of each data set, resolved once per data set."""
+
+    def __init__(self, graph: Graph):
+        self.graph = graph
+        self._dimensions = {}
+        self._required = {}
+
+    def dimensions(self, dataset):
+        if dataset not in self._dimensions:
+            properties = _path(self.graph, dataset, QB.structure, QB.component, QB.componentProperty)
+            self._dimensions[dataset] = sorted(
+                prop for prop in properties if _is_a(self.graph, prop, QB.DimensionProperty))
+        return self._dimensions[dataset]
+
+    def required_attributes(self, dataset):
+        if dataset not in self._required:
+            self._required[dataset] = sorted(
+                attr for component in _path(self.graph, dataset, QB.structure, QB.component)
+                if (component, QB.componentRequired, TRUE) in self.graph
+                for attr in self.graph.objects(component, QB.componentProperty))
+        return self._required[dataset]
+
+
+class _StructureIndex:
+    """Component and measure properties of each DSD, resolved once per DSD."""
+
+    def __init__(self, graph: Graph):
+        self.graph = graph
+        self._components = {}
+        self._measures = {}
+
+    def components(self, dsd):
+        if dsd not in self._components:
+            self._components[dsd] = _path(self.graph, dsd, QB.component, QB.componentProperty)
+        return self._components[dsd]
+
+    def measures(self, dsd):
+        if dsd not in self._measures:
+            self._measures[dsd] = {prop for prop in self.components(dsd) if _is_a(self.graph, prop, QB.MeasureProperty)}
+        return self._measures[dsd]
+
+    def uses_measure_type(self, dsd):
+        return QB.measureType in self.components(dsd)
+
+
+def _path(graph: Graph, start, *predicates):
+    nodes = {start}
+    for predicate in predicates:
+        nodes = {o for node in nodes for o in graph.objects(node, predicate)}
+    return nodes
+
+
+def _closure(graph: Graph, roots, predicate, inverse=False):
+    reached = set()
+    stack = list(roots)
+    while stack:
+        node = stack.pop()
+        if node in reached:
+            continue
+        reached.add(node)
+        stack.extend(graph.subjects(predicate, node) if inverse else graph.objects(node, predicate))
+    return reached
+
+
+def _is_a(graph: Graph, node, type_):
+    return (node, RDF.type, type_) in graph
+
+
+def _missing(graph: Graph, subject, predicate):
+    return next(graph.objects(subject, predicate), None) is None
+
+
+def _has_subject(graph: Graph, predicate, obj):
+    return next(graph.subjects(predicate, obj), None) is not None
+
+
+def _coded_values(graph: Graph, list_type):
+    """
+    Yields (values, code_list) for every dimension of a data set with a code list of
+    list_type, values being the distinct values its observations take in the dimension.
+    """
+    index = _DatasetIndex(graph)
+    observations = defaultdict(list)
+    for obs, dataset in graph.subject_objects(QB.dataSet):
+        observations[dataset].append(obs)
+    for dataset, members in observations.items():
+        for dim in index.dimensions(dataset):
+            code_lists = [code_list for code_list in graph.objects(dim, QB.codeList)
+                          if _is_a(graph, code_list, list_type)]
+            if code_lists:
+                values = {value for obs in members for value in graph.objects(obs, dim)}
+                for code_list in code_lists:
+                    yield values, code_list
+
+
+class _CodeListIndex:
+    """
+    The codes allowed by each code list, computed once per code list so that every value
+    is checked with a set lookup instead of a property path evaluation per observation.
+    """
+
+    def __init__(self, graph: Graph):
+        self.graph = graph
+        self._codes = {}
+
+    def scheme(self, code_list):
+        """Concepts in the concept scheme (skos:inScheme)."""
+        return self._cached(('scheme', code_list), lambda: self._concepts(
+            self.graph.subjects(SKOS.inScheme, code_list)))
+
+    def collection(self, code_list):
+        """Concepts reachable from the collection over skos:member+."""
+        return self._cached(('collection', code_list), lambda: self._concepts(
+            _closure(self.graph, self.graph.objects(code_list, SKOS.member), SKOS.member)))
+
+    def hierarchy(self, code_list, prop, inverse: bool):
+        """Nodes reachable from the roots of the hierarchy over prop* (^prop* if inverse)."""
+        return self._cached(('hierarchy', code_list, prop, inverse), lambda: _closure(
+            self.graph, self.graph.objects(code_list, QB.hierarchyRoot), prop, inverse))
+
+    def _cached(self, key, compute):
+        if key not in self._codes:
+            self._codes[key] = compute()
+        return self._codes[key]
+
+    def _concepts(self, nodes):
+        return {node for node in nodes if _is_a(self.graph, node, SKOS.Concept)}
+
+
+def _parent_child_properties(graph: Graph, inverse: bool):
+    properties = set()
+    for pcp in graph.objects(None, QB.parentChildProperty):
+        if not inverse and isinstance(pcp, URIRef):
+            properties.add(pcp)
+        elif inverse and isinstance(pcp, BNode):
+            properties.update(graph.objects(pcp, OWL.inverseOf))
+    return sorted(properties)
+
+
+def _hierarchy_violations(graph: Graph, inverse: bool):
+    index = _CodeListIndex(graph)
+    offending = []
+    for values, code_list in _coded_values(graph, QB.HierarchicalCodeList):
+        for pcp in graph.objects(code_list, QB.parentChildProperty):
+            if inverse and isinstance(pcp, BNode):
+                properties = graph.objects(pcp, OWL.inverseOf)
+            elif not inverse and isinstance(pcp, URIRef):
+                properties = [pcp]
+            else:
+                continue
+            for prop in properties:
+                offending.extend(values - index.hierarchy(code_list, prop, inverse))
+    return offending
+
+
+def _term_key(term):
+    # SPARQL compares literals by value ("1"^^xsd:int = "01"^^xsd:integer)
+    if isinstance(term, Literal) and term.value is not None:
+        return 'literal', term.value, term.language
+    return term
+
+
+def _dimension_key(graph: Graph, obs, dimensions):
+    key = []
+    for dim in dimensions:
+        values = set(graph.objects(obs, dim))
+        if len(values) != 1:
+            return None
+        key.append(_term_key(values.pop()))
+    return tuple(key)
+
+
+def _all_equal(graph: Graph, obs1, obs2, dimensions):
+    compared = False
+    for dim in dimensions:
+        values1 = {_term_key(v) for v in graph.objects(obs1, dim)}
+        values2 = {_term_key(v) for v in graph.objects(obs2, dim)}
+        if not values1 or not values2:
+            continue
+        if len(values1) != 1 or values1 != values2:
+            return False
+        compared = True
+    return compared
+
+
+def _any_different(graph: Graph, obs1, obs2, dimensions):
+    return any(_term_key(v1) != _term_key(v2)
+               for dim in dimensions
+               for v1 in graph.objects(obs1, dim)
+               for v2 in graph.objects(obs2, dim))
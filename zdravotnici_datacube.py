@@ -1,171 +1,77 @@
 #!/usr/bin/env python3
-import csv
-import pandas as pd
-import html
-from urllib.parse import quote
-
-import rdflib 
-from rdflib import Graph, BNode, Literal, Namespace
-# See https://rdflib.readthedocs.io/en/latest/_modules/rdflib/namespace.html
-from rdflib.namespace import QB, RDF, XSD,SKOS
-
-NS = Namespace("https://example.org/ontology#")
-NSR = Namespace("https://example.org/resources/")
-# We use custom Namespace here as the generated is limited in content
-# https://rdflib.readthedocs.io/en/stable/_modules/rdflib/namespace/_RDFS.html
-RDFS = Namespace("http://www.w3.org/2000/01/rdf-schema#")
-DCT = Namespace("http://purl.org/dc/terms/")
-OKRESY = Namespace("https://example.org/okresy/")
-KRAJE = Namespace("https://example.org/kraje/")
-OBORY = Namespace("https://example.org/obor-pece/")
-SDMX_SUBJECT = Namespace("http://purl.org/linked-data/sdmx/2009/subject#")
-SDMX_CONCEPT = Namespace("http://purl.org/linked-data/sdmx/2009/concept#")
-SDMX_MEASURE = Namespace("http://purl.org/linked-data/sdmx/2009/measure#")
-
-
-def main():
-    required_columns = ['KrajCode','OkresCode','DruhZarizeni']
-    df = pd.read_csv('data/zdravotnici.csv',usecols=required_columns)
-    df = df.groupby(required_columns).size().reset_index(name ='Count')
-    data_cube = as_data_cube(df.to_dict(orient='records'))
-
-    with open('zdravotnici_datacube.ttl','wb') as f:
-        f.write(data_cube.serialize(format="ttl",encoding='utf-8'))
-    run_constraint_checks(data_cube)
-    print("-" * 80)
-
-
-def load_csv_file_as_object(file_path: str):
-    result = []
-    with open(file_path, "r") as stream:
-        reader = csv.reader(stream)
-        header = next(reader)  # Skip header
-        for line in reader:
-            result.append({key: value for key, value in zip(header, line)})
-    return result
-
-
-def as_data_cube(data):
-    result = rdflib.Graph()
-    dimensions = create_dimensions(result)
-    measures = create_measure(result)
-    structure = create_structure(result, dimensions, measures)
-    dataset = create_dataset(result, structure)
-    create_observations(result, dataset, data)
-    return result
-
-
-def create_dimensions(collector: Graph):
-
-    okres = NS.okres
-    collector.add((okres, RDF.type, RDFS.Property))
-    collector.add((okres, RDF.type, QB.DimensionProperty))
-    collector.add((okres, RDFS.label, Literal("Okres", lang="cs")))
-    collector.add((okres, RDFS.label, Literal("County", lang="en")))
-    collector.add((okres, SKOS.prefLabel, Literal("County")))
-    collector.add((okres, RDFS.range, XSD.string))
-
-    kraj = NS.kraj
-    collector.add((kraj, RDF.type, RDFS.Property))
-    collector.add((kraj, RDF.type, QB.DimensionProperty))
-    collector.add((kraj, RDFS.label, Literal("Kraj", lang="cs")))
-    collector.add((kraj, RDFS.label, Literal("County", lang="en")))
-    collector.add((kraj, SKOS.prefLabel, Literal("County")))
-    collector.add((kraj, RDFS.range, XSD.string))
-
-    obor_pece = NS.obor_pece
-    collector.add((obor_pece, RDF.type, RDFS.Property))
-    collector.add((obor_pece, RDF.type, QB.DimensionProperty))
-    collector.add((obor_pece, RDFS.label, Literal("Obor pece", lang="cs")))
-    collector.add((obor_pece, RDFS.label, Literal("Field of care", lang="en")))
-    collector.add((obor_pece, SKOS.prefLabel, Literal("Field of care")))
-    collector.add((obor_pece, RDFS.range, XSD.string))
-
-
-
-    return [okres, kraj, obor_pece]
-
-
-def create_measure(collector: Graph):
-    
-    number_of_care_providers = NS.number_of_care_providers
-    collector.add( ( number_of_care_providers, RDF.type, RDFS.Property) )
-    collector.add( ( number_of_care_providers, RDF.type, QB.MeasureProperty ) )
-    collector.add( ( number_of_care_providers, RDFS.label, Literal("Pocet poskytovatelu pece", lang="cs") ) )
-    collector.add( ( number_of_care_providers, RDFS.label, Literal("Number of care providers", lang="en") ) )
-    collector.add((number_of_care_providers, SKOS.prefLabel, Literal("Number of care providers")))
-    collector.add( ( number_of_care_providers, RDFS.range, XSD.integer ) )
-    collector.add( (number_of_care_providers,  RDFS.subPropertyOf, SDMX_MEASURE.obsValue))
-
-    return [number_of_care_providers]
-
-
-def create_structure(collector: Graph, dimensions, measures):
-
-    structure = NS.structure
-    collector.add((structure, RDF.type, QB.DataStructureDefinition))
-
-    for dimension in dimensions:
-        component = BNode()
-        collector.add((structure, QB.component, component))
-        collector.add((component, QB.dimension, dimension))
-
-    for measure in measures:
-        component = BNode()
-        collector.add((structure, QB.component, component))
-        collector.add((component, QB.measure, measure))
-        collector.add((component, QB.componentProperty, measure))
-        collector.add((component, QB.measureDimension, measure))
-    return structure
+from __future__ import annotations
+
+from rdflib.namespace import SKOS, XSD
+
+import cube_engine
+import table_cache
+from cube_engine import (NS, NSR, OKRESY, KRAJE, OBORY, KRAJE_CODES, OKRESY_CODES, CodeList, Component, CubeSpec,
+                         Dataset)
+from lazy_import import lazy_import
+
+pd = lazy_import('pandas')
+
+
+def obor_concepts(df: pd.DataFrame):
+    # There is no code list of the facility types, the types in the table make one up
+    codes = sorted(df['DruhZarizeni'].unique())
+    return pd.DataFrame({'code': codes, 'label': codes})
+
+
+OBORY_CODES = CodeList(NSR.obory, {'cs': "Obory pece", 'en': "Fields of care"}, OBORY, obor_concepts)
+
+SPEC = CubeSpec(
+    name='zdravotnici',
+    output='zdravotnici_datacube.ttl',
+    structure=NS.structure,
+    dimensions=[
+        Component(NS.okres, 'OkresCode', {'cs': "Okres", 'en': "County"}, "County", SKOS.Concept, OKRESY,
+                  OKRESY_CODES),
+        Component(NS.kraj, 'KrajCode', {'cs': "Kraj", 'en': "County"}, "County", SKOS.Concept, KRAJE,
+                  KRAJE_CODES),
+        Component(NS.obor_pece, 'DruhZarizeni', {'cs': "Obor pece", 'en': "Field of care"}, "Field of care",
+                  SKOS.Concept, OBORY, OBORY_CODES),
+    ],
+    measures=[
+        Component(NS.number_of_care_providers, 'Count',
+                  {'cs': "Pocet poskytovatelu pece", 'en': "Number of care providers"},
+                  "Number of care providers", XSD.integer),
+    ],
+    dataset=Dataset(
+        iri=NSR.dataCubeInstance,
+        labels={'cs': "Poskytovatele zdravotnich sluzeb", 'en': "Care Providers"},
+        description="Care Providers Czechia",
+        comment="Number of different types of care providers in counties of Czechia",
+        issued="2023-3-12",
+        publisher="Tomas Zasadil",
+        subjects=[NS.Health, NS.RegionalStatictics, NS.Czechia],
+    ),
+)
+
+
+GROUP_COLUMNS = ['KrajCode','OkresCode','DruhZarizeni']
+
+
+def load_table(args):
+    return table_cache.cached(SPEC.name, ['data/zdravotnici.csv'], repr(GROUP_COLUMNS),
+                              lambda: count_groups('data/zdravotnici.csv', GROUP_COLUMNS, args.csv_chunksize))
+
+
+def count_groups(file_path: str, columns, chunksize: int):
+    # Running group sizes merged chunk by chunk, only the counts are ever kept in memory
+    counts = None
+    # Codes are read as strings so that a chunk with only missing values keeps the same dtype
+    dtypes = {column: str for column in columns}
+    for chunk in pd.read_csv(file_path, usecols=columns, dtype=dtypes, chunksize=chunksize):
+        partial = chunk.groupby(columns).size()
+        if counts is None:
+            counts = partial
+        else:
+            counts = pd.concat([counts, partial]).groupby(level=columns).sum()
+    if counts is None:
+        return pd.DataFrame(columns=columns + ['Count'])
+    return counts.reset_index(name='Count')
 
 
-def create_dataset(collector: Graph, structure):
-
-    dataset = NSR.dataCubeInstance
-
-    collector.add((dataset, RDF.type, QB.DataSet))
-    collector.add((dataset, RDFS.label, Literal("Poskytovatele zdravotnich sluzeb", lang="cs")))
-    collector.add((dataset, RDFS.label, Literal("Care Providers", lang="en")))
-    collector.add((dataset, QB.structure, structure))
-
-    collector.add((dataset, DCT.description, Literal("Care Providers Czechia")))
-    collector.add((dataset, DCT.comment, Literal("Number of different types of care providers in counties of Czechia")))
-    collector.add((dataset, DCT.issued, Literal("2023-3-12", datatype=XSD.date)))
-    collector.add((dataset, DCT.publisher, Literal("Tomas Zasadil")))
-
-    collector.add((dataset, DCT.subject, NS.Health))
-    collector.add((dataset, DCT.subject, NS.RegionalStatictics))
-    collector.add((dataset, DCT.subject, NS.Czechia))
-   
-
-    return dataset
-
-
-def create_observations(collector: Graph, dataset, data):
-    for index, row in enumerate(data):
-        resource = NSR["observation-" + str(index).zfill(3)]
-        create_observation(collector, dataset, resource, row)
-
-
-def create_observation(collector: Graph, dataset, resource, data):
-    collector.add((resource, RDF.type, QB.Observation))
-    collector.add((resource, QB.dataSet, dataset))
-    collector.add((resource, NS.okres, OKRESY[escape(data["OkresCode"])]))
-    collector.add((resource, NS.kraj, KRAJE[escape(data["KrajCode"])]))
-    collector.add((resource, NS.obor_pece, OBORY[escape(data["DruhZarizeni"])]))
-    collector.add((resource, NS.number_of_care_providers, Literal(data["Count"], datatype=XSD.integer)))
-
-def escape(value):
-    return quote(value.replace(' ','_'))
-
-def run_constraint_checks(graph: Graph):
-    import constrains
-    graph.namespace_manager.bind('qb',QB)
-    graph.namespace_manager.bind('skos',SKOS)
-    for query in constrains.integrity_queries:
-        result = graph.query(query)
-        assert not result.askAnswer, 'The datacube is not well formed'
-    print('All tests have passed => the datacube is well formed')
-
 if __name__ == "__main__":
-    main()
+    cube_engine.main(SPEC, load_table)